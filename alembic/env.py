@@ -9,6 +9,9 @@ from app.models.base import Base
 # For accessing all models
 import app.models.target
 import app.models.session
+import app.models.caption
+import app.models.note
+import app.models.job
 
 # This is the Alembic Config object
 config = context.config
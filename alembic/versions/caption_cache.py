@@ -0,0 +1,46 @@
+"""memoize captions by image content, explicit caption status
+
+Revision ID: caption_cache
+Revises: packed_embeddings
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'caption_cache'
+down_revision = 'packed_embeddings'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('image_captions',
+        sa.Column('image_hash', sa.String(), nullable=False),
+        sa.Column('caption_version', sa.String(), nullable=False),
+        sa.Column('caption', sa.JSON(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('NOW()'), nullable=False),
+        sa.PrimaryKeyConstraint('image_hash', 'caption_version')
+    )
+    op.add_column('targets', sa.Column('caption_status', sa.String(),
+                                       server_default='pending', nullable=False))
+    op.add_column('targets', sa.Column('image_hash', sa.String(), nullable=True))
+
+    # Replace the {"placeholder": "unknown"} sentinel with an explicit status
+    op.execute("""
+        UPDATE targets SET
+            caption_status = CASE
+                WHEN caption::jsonb ? 'placeholder' THEN 'pending'
+                WHEN caption::jsonb ->> 'setting' = 'unknown' THEN 'failed'
+                ELSE 'ready' END,
+            caption = CASE WHEN caption::jsonb ? 'placeholder' THEN '{}' ELSE caption END
+    """)
+
+
+def downgrade():
+    op.execute("""UPDATE targets SET caption = '{"placeholder": "unknown"}'
+                  WHERE caption_status = 'pending'""")
+    op.drop_column('targets', 'image_hash')
+    op.drop_column('targets', 'caption_status')
+    op.drop_table('image_captions')
@@ -0,0 +1,27 @@
+"""client ids for batched session notes
+
+Revision ID: note_client_ids
+Revises: scoring_jobs
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'note_client_ids'
+down_revision = 'scoring_jobs'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('session_notes', sa.Column('client_id', sa.String(), nullable=True))
+    # NULLs never conflict, so notes without a client id are unaffected
+    op.create_index('uq_session_notes_client', 'session_notes', ['session_id', 'client_id'],
+                    unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_session_notes_client', table_name='session_notes')
+    op.drop_column('session_notes', 'client_id')
@@ -0,0 +1,25 @@
+"""store the notes embedding on scored sessions
+
+Revision ID: notes_embedding
+Revises: note_client_ids
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'notes_embedding'
+down_revision = 'note_client_ids'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sessions', sa.Column('notes_embedding', sa.LargeBinary(), nullable=True))
+    op.add_column('sessions', sa.Column('notes_embedding_model', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('sessions', 'notes_embedding_model')
+    op.drop_column('sessions', 'notes_embedding')
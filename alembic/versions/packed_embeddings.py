@@ -0,0 +1,62 @@
+"""store target embeddings as packed binary
+
+Revision ID: packed_embeddings
+Revises: target_embeddings
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from app.models.types import pack_vectors, unpack_vectors
+
+# revision identifiers, used by Alembic.
+revision = 'packed_embeddings'
+down_revision = 'target_embeddings'
+branch_labels = None
+depends_on = None
+
+# Row order of the packed matrix, see app.services.score.VECTOR_KEYS
+VECTOR_KEYS = ("full", "color", "shape", "concept", "sensory")
+
+targets = sa.table('targets', sa.column('target_id', sa.String()),
+                   sa.column('embeddings_json', sa.JSON()))
+
+
+def upgrade():
+    op.alter_column('targets', 'embeddings', new_column_name='embeddings_json')
+    op.add_column('targets', sa.Column('embeddings', sa.LargeBinary(), nullable=True))
+    op.add_column('targets', sa.Column('embedding_model', sa.String(), nullable=True))
+    op.add_column('targets', sa.Column('caption_hash', sa.String(), nullable=True))
+
+    # Convert existing JSON float lists into packed float32 matrices
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT target_id, embeddings_json FROM targets WHERE embeddings_json IS NOT NULL"))
+    for target_id, record in rows.all():
+        vectors = [record["vectors"][k] for k in VECTOR_KEYS]
+        conn.execute(
+            sa.text("UPDATE targets SET embeddings=:e, embedding_model=:m, caption_hash=:h"
+                    " WHERE target_id=:t"),
+            {"e": pack_vectors(vectors), "m": record["model"],
+             "h": record["caption_hash"], "t": target_id})
+
+    op.drop_column('targets', 'embeddings_json')
+
+
+def downgrade():
+    op.add_column('targets', sa.Column('embeddings_json', sa.JSON(), nullable=True))
+
+    conn = op.get_bind()
+    rows = conn.execute(sa.text(
+        "SELECT target_id, embeddings, embedding_model, caption_hash FROM targets"
+        " WHERE embeddings IS NOT NULL"))
+    for target_id, blob, model, key in rows.all():
+        vectors = dict(zip(VECTOR_KEYS, unpack_vectors(blob).tolist()))
+        conn.execute(
+            sa.update(targets).where(targets.c.target_id == target_id)
+            .values(embeddings_json={"model": model, "caption_hash": key, "vectors": vectors}))
+
+    op.drop_column('targets', 'caption_hash')
+    op.drop_column('targets', 'embedding_model')
+    op.drop_column('targets', 'embeddings')
+    op.alter_column('targets', 'embeddings_json', new_column_name='embeddings')
@@ -0,0 +1,43 @@
+"""durable scoring jobs
+
+Revision ID: scoring_jobs
+Revises: session_status
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'scoring_jobs'
+down_revision = 'session_status'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'scoring_jobs',
+        sa.Column('job_id', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('session_id', sa.Integer(),
+                  sa.ForeignKey('sessions.session_id', ondelete='CASCADE'), nullable=False),
+        sa.Column('idempotency_key', sa.String(), nullable=False, unique=True),
+        sa.Column('status', sa.String(), server_default='queued', nullable=False),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('run_at', sa.TIMESTAMP(), nullable=False),
+        sa.Column('locked_by', sa.String(), nullable=True),
+        sa.Column('last_error', sa.String(), nullable=True),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('NOW()'), nullable=False),
+        sa.Column('finished_at', sa.TIMESTAMP(), nullable=True),
+    )
+    op.create_index('idx_scoring_jobs_due', 'scoring_jobs', ['run_at'],
+                    postgresql_where=sa.text("status IN ('queued', 'running')"))
+    # Sessions caught mid-scoring by the switch would otherwise never finish
+    op.execute("INSERT INTO scoring_jobs(session_id, idempotency_key, run_at)"
+               " SELECT session_id, 'session:' || session_id, NOW()"
+               " FROM sessions WHERE status = 'scoring'")
+
+
+def downgrade():
+    op.drop_index('idx_scoring_jobs_due', table_name='scoring_jobs')
+    op.drop_table('scoring_jobs')
@@ -0,0 +1,59 @@
+"""append-only session notes
+
+Revision ID: session_notes
+Revises: target_pool
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+import re
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'session_notes'
+down_revision = 'target_pool'
+branch_labels = None
+depends_on = None
+
+# Notes used to be appended to sessions.user_notes as "\n[Stage N] text"
+NOTE = re.compile(r"\n\[Stage (\d+)\] ")
+
+
+def upgrade():
+    notes = op.create_table(
+        'session_notes',
+        sa.Column('seq', sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column('session_id', sa.Integer(),
+                  sa.ForeignKey('sessions.session_id', ondelete='CASCADE'), nullable=False),
+        sa.Column('stage', sa.Integer(), nullable=False),
+        sa.Column('text', sa.String(), nullable=False),
+        sa.Column('created_at', sa.TIMESTAMP(), server_default=sa.text('NOW()'), nullable=False),
+    )
+    op.create_index('idx_session_notes_session', 'session_notes', ['session_id', 'seq'])
+
+    # Split the existing transcripts into rows; anything before the first
+    # stage marker is kept as a stage 0 note
+    conn = op.get_bind()
+    rows = []
+    for sid, text, ts in conn.execute(sa.text(
+            "SELECT session_id, user_notes, ts FROM sessions"
+            " WHERE user_notes <> '' ORDER BY session_id")):
+        parts = NOTE.split(text)
+        if parts[0]:
+            rows.append({"session_id": sid, "stage": 0, "text": parts[0], "created_at": ts})
+        for stage, note in zip(parts[1::2], parts[2::2]):
+            rows.append({"session_id": sid, "stage": int(stage), "text": note, "created_at": ts})
+    if rows:
+        op.bulk_insert(notes, rows)
+    op.execute("UPDATE sessions SET user_notes = ''")
+
+
+def downgrade():
+    op.execute(
+        "UPDATE sessions s SET user_notes = n.transcript FROM ("
+        " SELECT session_id, string_agg(CASE WHEN stage = 0 THEN text"
+        " ELSE '\n[Stage ' || stage || '] ' || text END, '' ORDER BY seq)"
+        " AS transcript FROM session_notes GROUP BY session_id) n"
+        " WHERE n.session_id = s.session_id")
+    op.drop_index('idx_session_notes_session', table_name='session_notes')
+    op.drop_table('session_notes')
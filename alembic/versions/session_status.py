@@ -0,0 +1,32 @@
+"""explicit session status
+
+Revision ID: session_status
+Revises: session_notes
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'session_status'
+down_revision = 'session_notes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sessions', sa.Column('status', sa.String(), server_default='open', nullable=False))
+    # A scored session has a rubric even when its total is 0
+    op.execute("UPDATE sessions SET status = 'scored'"
+               " WHERE total_score <> 0 OR rubric::text NOT IN ('{}', 'null')")
+    op.create_index('idx_sessions_open', 'sessions', ['session_id'],
+                    postgresql_where=sa.text("status = 'open'"))
+    op.create_index('idx_sessions_scoring', 'sessions', ['session_id'],
+                    postgresql_where=sa.text("status = 'scoring'"))
+
+
+def downgrade():
+    op.drop_index('idx_sessions_scoring', table_name='sessions')
+    op.drop_index('idx_sessions_open', table_name='sessions')
+    op.drop_column('sessions', 'status')
@@ -0,0 +1,24 @@
+"""store per-target embeddings
+
+Revision ID: target_embeddings
+Revises: initial
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'target_embeddings'
+down_revision = 'initial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Description + category vectors, computed once per caption/model
+    op.add_column('targets', sa.Column('embeddings', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('targets', 'embeddings')
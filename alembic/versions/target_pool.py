@@ -0,0 +1,28 @@
+"""pre-warmed target pool
+
+Revision ID: target_pool
+Revises: caption_cache
+Create Date: 2026-10-17 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = 'target_pool'
+down_revision = 'caption_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('targets', sa.Column('claimed_at', sa.TIMESTAMP(), nullable=True))
+    # Every existing target was handed out when it was created
+    op.execute("UPDATE targets SET claimed_at = created_at")
+    op.create_index('idx_targets_pool', 'targets', ['created_at'],
+                    postgresql_where=sa.text('claimed_at IS NULL'))
+
+
+def downgrade():
+    op.drop_index('idx_targets_pool', table_name='targets')
+    op.drop_column('targets', 'claimed_at')
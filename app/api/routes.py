@@ -1,76 +1,190 @@
-from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException
+import time
+from typing import AsyncIterable, Literal
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.sse import EventSourceResponse, ServerSentEvent
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, text
-from app.db.session import get_db_session
-from app.services.targets import create_target
-from app.services.ai import describe_image
-from app.services.score import score
+from app.db.session import get_db_session, get_async_db, get_async_db_session, engine, async_engine
+from app.db.pool import pool_metrics
+from app.api.schemas import (Ok, Health, NewTarget, NewSession, FinishStatus, NoteBatch, NotesAdded,
+                             SessionPage, SessionSummary, SessionDetail, columns)
+from app.services.target_pool import claim_target
+from app.services.targets import TargetUnavailableError
+from app.services.sessions import list_sessions_stmt
+from app.services.jobs import enqueue_stmt, job_by_key_stmt, default_key
+from app.services.notes import add_note_stmt, add_notes_stmt, notes_stmt, format_notes
+from app.services import events
+from app.services.judge import judge_session, DEFAULT_DECOYS, MAX_DECOYS
+from app.services.stats import history_significance, DEFAULT_PERMUTATIONS
 from app.models.session import Session as SessionModel
-from app.models.target import Target
-import threading
-import time
 
 router = APIRouter()
 
+# Session statuses that end a wait
+DONE = ("scored", "failed")
+
+# For routes that write: commit before the response is sent, not after
+# (the default "request" scope), so a client never acts on uncommitted rows
+WriteDB = Depends(get_async_db_session, scope="function")
+
 @router.get("/health") 
-def health(): 
+async def health() -> Health: 
     return {"status":"ok"}
 
 @router.post("/targets/random") 
-def new_target(): 
-    return {"trn": create_target()}
+async def new_target() -> NewTarget: 
+    """Hand out a pre-warmed target from the pool"""
+    try:
+        return {"trn": await claim_target()}
+    except TargetUnavailableError as e:
+        raise HTTPException(503, str(e))
 
 @router.post("/sessions")
-def new_session(p: dict, db: Session = Depends(get_db_session)):
-    trn = p["trn"]
-    result = db.execute(text(
+async def new_session(p: dict, db: AsyncSession = WriteDB) -> NewSession:
+    result = await db.execute(text(
          "INSERT INTO sessions(target_id,user_notes,stage_durations,rubric,total_score,aols)"
-         f" VALUES('{trn}','','{{}}','{{}}',0,'[]') RETURNING session_id"))
+         " VALUES(:trn,'','{}','{}',0,'[]') RETURNING session_id"), {"trn": p["trn"]})
     sid = result.scalar_one()
     return {"session_id": sid}
 
 @router.get("/sessions")
-def list_sessions(status: str = None, db: Session = Depends(get_db_session)):
-    """List sessions, optionally filtering by status"""
-    query = select(SessionModel)
-    if status == "unfinished":
-        # Return sessions with a score of 0 (not yet scored/finished)
-        query = query.where(SessionModel.total_score == 0)
-    sessions = db.execute(query).scalars().all()
-    return [s.__dict__ for s in sessions]
+async def list_sessions(status: Literal["open", "scoring", "scored", "failed", "unfinished"] = None,
+                        target_id: str = None, before: int = None,
+                        limit: int = Query(50, ge=1, le=200),
+                        db: AsyncSession = Depends(get_async_db_session)) -> SessionPage:
+    """List sessions newest first; pass ``next_cursor`` back as ``before`` for the next page"""
+    if status == "unfinished":  # older clients
+        status = "open"
+    stmt = list_sessions_stmt(columns(SessionSummary, SessionModel), status, target_id, before, limit)
+    rows = (await db.execute(stmt)).all()
+    cursor = rows[-1].session_id if len(rows) == limit else None
+    return {"sessions": rows, "next_cursor": cursor}
+
+async def _require_session(sid: int):
+    # A dependency, so it also runs before an event stream starts (a 404 can still be sent)
+    async with get_async_db() as db:
+        found = await db.execute(select(SessionModel.session_id).where(SessionModel.session_id==sid))
+        if found.scalar_one_or_none() is None:
+            raise HTTPException(404)
+
+async def _lock_open_session(db: AsyncSession, sid: int):
+    """404 for an unknown session, 409 unless it is open
+
+    The row stays locked until commit, so a concurrent finish can't lock
+    the transcript while notes are being added.
+    """
+    status = (await db.execute(select(SessionModel.status).where(SessionModel.session_id==sid)
+                               .with_for_update())).scalar_one_or_none()
+    if status is None:
+        raise HTTPException(404)
+    if status != "open":
+        raise HTTPException(409, f"Session is {status}; notes can no longer be added")
 
 @router.post("/sessions/{sid}/note")
-def add_note(sid: int, p: dict, db: Session = Depends(get_db_session)):
-    db.execute(update(SessionModel).where(SessionModel.session_id==sid)
-        .values(user_notes=SessionModel.user_notes+f"\n[Stage {p['stage']}] {p['text']}"))
+async def add_note(sid: int, p: dict, db: AsyncSession = WriteDB) -> Ok:
+    await _lock_open_session(db, sid)
+    await db.execute(add_note_stmt(sid, p["stage"], p["text"]))
     return {"ok": True}
 
+@router.post("/sessions/{sid}/notes")
+async def add_notes(sid: int, batch: NoteBatch, db: AsyncSession = WriteDB) -> NotesAdded:
+    """Append an ordered batch of notes in one transaction; only while the session is open"""
+    await _lock_open_session(db, sid)
+    if not batch.notes:
+        return {"added": 0}
+    notes = [n.model_dump() for n in batch.notes]
+    added = (await db.execute(add_notes_stmt(db, sid, notes))).scalars().all()
+    return {"added": len(added)}
+
 @router.post("/sessions/{sid}/finish")
-def finish(sid: int, bg: BackgroundTasks, db: Session = Depends(get_db_session)):
-    def _work():
-        from app.db.session import SessionLocal
-        db_session = SessionLocal()
-        try:
-            ses = db_session.execute(select(SessionModel).where(SessionModel.session_id==sid)).scalar_one()
-            tgt = db_session.execute(select(Target).where(Target.target_id==ses.target_id)).scalar_one()
-            desc = describe_image(tgt.image_url)
-            res = score(ses.user_notes, desc)
-            db_session.execute(update(Target).where(Target.target_id==tgt.target_id).values(caption=desc))
-            db_session.execute(update(SessionModel).where(SessionModel.session_id==sid)
-                        .values(rubric=res["rubric"], total_score=res["total"]))
-            db_session.commit()
-        except Exception as e:
-            db_session.rollback()
-            print(f"Error in background task: {e}")
-        finally:
-            db_session.close()
-    
-    bg.add_task(_work)
-    return {"status": "scoring"}
+async def finish(sid: int, idempotency_key: str | None = Header(None),
+                 db: AsyncSession = WriteDB) -> FinishStatus:
+    """Queue the session for scoring by the worker pool (python -m app.worker)"""
+    if (await db.execute(select(SessionModel.session_id)
+                         .where(SessionModel.session_id==sid))).scalar_one_or_none() is None:
+        raise HTTPException(404)
+    key = idempotency_key or default_key(sid)
+    job = ((await db.execute(enqueue_stmt(db, sid, key))).one_or_none()
+           or (await db.execute(job_by_key_stmt(key))).one())
+    if job.session_id != sid:
+        raise HTTPException(409, "Idempotency-Key was already used for another session")
+    if job.status == "done":
+        return {"status": "scored", "job_id": job.job_id}
+    # Only from open (or failed, when a dead job was re-queued): a repeated
+    # finish must not overwrite the "scored" a worker is committing
+    await db.execute(update(SessionModel)
+                     .where(SessionModel.session_id==sid,
+                            SessionModel.status.in_(("open", "failed")))
+                     .values(status="scoring"))
+    return {"status": "scoring", "job_id": job.job_id}
 
-@router.get("/sessions/{sid}")
-def get_session(sid: int, db: Session = Depends(get_db_session)):
-    ses = db.execute(select(SessionModel).where(SessionModel.session_id==sid)).scalar_one_or_none()
+async def _session_detail(db: AsyncSession, sid: int) -> dict:
+    cols = columns(SessionDetail, SessionModel, skip=("user_notes",))
+    ses = (await db.execute(select(*cols).where(SessionModel.session_id==sid))).one_or_none()
     if not ses: 
         raise HTTPException(404)
-    return ses.__dict__ 
\ No newline at end of file
+    rows = (await db.execute(notes_stmt([sid]))).all()
+    return {**ses._mapping, "user_notes": format_notes((r.stage, r.text) for r in rows)}
+
+async def _load_session(sid: int) -> dict:
+    # A short-lived session, so no connection is held while waiting
+    async with get_async_db() as db:
+        return await _session_detail(db, sid)
+
+@router.get("/sessions/{sid}")
+async def get_session(sid: int, db: AsyncSession = Depends(get_async_db_session)) -> SessionDetail:
+    return await _session_detail(db, sid)
+
+@router.get("/sessions/{sid}/result")
+async def session_result(sid: int, wait: float = Query(30, ge=0, le=120)) -> SessionDetail:
+    """Long-poll: answer as soon as the session is scored or failed, or after ``wait`` seconds"""
+    deadline = time.monotonic() + wait
+    with events.subscribe(sid) as changed:
+        while True:
+            ses = await _load_session(sid)
+            remaining = deadline - time.monotonic()
+            if ses["status"] in DONE or remaining <= 0:
+                return ses
+            await events.wait(changed, remaining)
+
+@router.get("/sessions/{sid}/events", response_class=EventSourceResponse,
+            dependencies=[Depends(_require_session)])
+async def session_events(sid: int) -> AsyncIterable[ServerSentEvent]:
+    """Server-Sent Events: the session now and after every status change, until it is done"""
+    with events.subscribe(sid) as changed:
+        ses = await _load_session(sid)
+        last = None
+        while True:
+            if ses["status"] != last:
+                last = ses["status"]
+                yield ServerSentEvent(event="status", data=SessionDetail(**ses))
+            if last in DONE:
+                return
+            await events.wait(changed)
+            ses = await _load_session(sid)
+
+# The NumPy-heavy routes stay sync: they run in the threadpool on the blocking engine
+@router.get("/sessions/{sid}/judge")
+def judge(sid: int, decoys: int = Query(DEFAULT_DECOYS, ge=0, le=MAX_DECOYS),
+          db: Session = Depends(get_db_session)):
+    """Rank the session's notes against its target plus random decoy targets"""
+    try:
+        res = judge_session(db, sid, decoys)
+    except ValueError as e:
+        raise HTTPException(409, str(e))
+    if res is None:
+        raise HTTPException(404)
+    return res
+
+@router.get("/stats/significance")
+def significance(permutations: int = Query(DEFAULT_PERMUTATIONS, ge=1, le=1_000_000),
+                 seed: int = None,
+                 db: Session = Depends(get_db_session)):
+    """Permutation test: do session notes match their own targets above chance?"""
+    return history_significance(db, permutations, seed)
+
+@router.get("/metrics/db")
+async def db_metrics():
+    """Connection pool occupancy and checkout wait times for both engines"""
+    return {"sync": pool_metrics(engine), "async": pool_metrics(async_engine.sync_engine)}
@@ -0,0 +1,64 @@
+"""
+API response schemas
+--------------------------------------------------
+Routes declare these as their return types, so FastAPI validates rows
+straight from the ORM (or from column-only selects) and serializes them to
+JSON bytes in pydantic-core, without `jsonable_encoder` or `json.dumps`.
+"""
+from datetime import datetime
+from pydantic import BaseModel, ConfigDict, Field
+
+class Schema(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
+class Ok(Schema):
+    ok: bool = True
+
+class Health(Schema):
+    status: str
+
+class NewTarget(Schema):
+    trn: str
+
+class NewSession(Schema):
+    session_id: int
+
+class NoteIn(Schema):
+    stage: int
+    text: str
+    # Client-chosen id; a note already stored under it is skipped
+    client_id: str | None = None
+
+class NoteBatch(Schema):
+    notes: list[NoteIn] = Field(max_length=1000)
+
+class NotesAdded(Schema):
+    added: int
+
+class FinishStatus(Schema):
+    status: str
+    job_id: int | None = None
+
+class SessionSummary(Schema):
+    """A row of GET /sessions; only these columns are selected"""
+    session_id: int
+    target_id: str
+    status: str
+    total_score: float
+    ts: datetime
+
+class SessionPage(Schema):
+    sessions: list[SessionSummary]
+    # Pass back as ``before`` for the next page; None on the last page
+    next_cursor: int | None
+
+class SessionDetail(SessionSummary):
+    user_notes: str
+    sketch_path: str | None
+    stage_durations: dict
+    rubric: dict
+    aols: list
+
+def columns(model: type[Schema], entity, skip: tuple = ()) -> list:
+    """The ORM columns of ``entity`` named by the schema's fields"""
+    return [getattr(entity, f) for f in model.model_fields if f not in skip]
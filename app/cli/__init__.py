@@ -4,12 +4,18 @@ rv – top-level CLI launcher
 • `rv` or `rv run`  →  guided CRV session
 • `rv help`         →  one-page quick help
 • `rv voice`        →  voice-guided CRV session
+• `rv stats`        →  is your session history above chance?
+• `rv ingest DIR`   →  bulk-load an image folder or tarball as targets
 (advanced users can still call hidden FastAPI or Typer
  commands; we expose only the friendly entry here.)
 """
 import typer, importlib
+from dotenv import load_dotenv
+
+# Load environment variables before the CLI modules read their settings
+load_dotenv()
+
 from .run_mode import run_mode
-from .run_mode_voice import voice_run
 
 app = typer.Typer(add_completion=False, rich_help_panel="Main Commands")
 
@@ -31,8 +37,62 @@ def run():
 def voice():
     """Start a voice-guided CRV session using OpenAI TTS and Whisper."""
     import asyncio
+    # Imported here: the audio stack (sounddevice/PortAudio) is only needed for voice
+    from .run_mode_voice import voice_run
     asyncio.run(voice_run())
 
+@app.command()
+def stats(permutations: int = typer.Option(20000, help="Number of random shuffles")):
+    """Test whether your scores across all sessions beat chance."""
+    from .client import API_ROOT
+    from .run_mode import console
+    import httpx
+    from rich.table import Table
+    with console.status("Shuffling targets…"):
+        res = httpx.get(f"{API_ROOT}/stats/significance",
+                        params={"permutations": permutations}, timeout=300).json()
+    if res.get("p_value") is None:
+        console.print(f"[yellow]{res.get('detail', 'Not enough data')}[/]")
+        return
+    table = Table(title="📊  Permutation Test", show_header=False)
+    table.add_row("Sessions analysed", str(res["sessions"]))
+    table.add_row("Skipped (no cached embedding)", str(res["skipped"]))
+    table.add_row("Mean total score", f"{res['mean_total_score']:.2f}")
+    table.add_row("Mean notes↔target similarity", f"{res['observed']:.4f}")
+    table.add_row("Chance level (mean ± sd)", f"{res['null_mean']:.4f} ± {res['null_std']:.4f}")
+    table.add_row("z-score", f"{res['z_score']:.2f}")
+    table.add_row("p-value", f"{res['p_value']:.4g}")
+    console.print(table)
+    verdict = ("[green]Above chance at p < 0.05[/]" if res["p_value"] < 0.05
+               else "[yellow]Not distinguishable from chance yet[/]")
+    console.print(verdict)
+
+@app.command()
+def ingest(path: str = typer.Argument(..., help="Image directory or tarball"),
+           workers: int = typer.Option(None, help="Worker processes (default: CPU count)"),
+           batch: int = typer.Option(200, help="Targets per INSERT"),
+           max_edge: int = typer.Option(1024, help="Shrink images to this longest edge"),
+           caption: bool = typer.Option(False, help="Also caption and embed new targets"),
+           checkpoint: str = typer.Option(None, help="Checkpoint file (default: per source)")):
+    """Load a curated image set into the target pool; safe to re-run after interruption."""
+    from .run_mode import console
+    from rich.progress import Progress, BarColumn, MofNCompleteColumn, TimeRemainingColumn
+    from app.services.ingest import ingest as run_ingest
+    with Progress("[progress.description]{task.description}", BarColumn(),
+                  MofNCompleteColumn(), TimeRemainingColumn(), console=console) as progress:
+        task = progress.add_task("Ingesting", total=None)
+
+        def update(s):
+            done = s["skipped"] + s["added"] + s["duplicates"] + s["failed"]
+            progress.update(task, total=s["total"], completed=done,
+                            description=f"Ingesting  +{s['added']} new  "
+                                        f"{s['duplicates']} dup  {s['failed']} bad")
+
+        stats = run_ingest(path, workers, batch, max_edge, caption, checkpoint, update)
+    console.print(f"[green]Added {stats['added']} targets[/]  "
+                  f"({stats['duplicates']} duplicates, {stats['failed']} unreadable, "
+                  f"{stats['skipped']} already ingested)")
+
 @app.command()
 def help():
     """Print a concise cheat-sheet without opening docs."""
@@ -40,6 +100,8 @@ def help():
         "─────────  RV CLI Cheat-Sheet  ─────────\n"
         "rv           : start / resume session (same as rv run)\n"
         "rv voice     : start voice-guided session\n"
+        "rv stats     : test session history against chance\n"
+        "rv ingest D  : bulk-load images from folder/tarball D\n"
         "make run     : alias for rv (convenience)\n"
         "make vrun    : alias for rv voice\n"
         "make dev     : start FastAPI backend\n"
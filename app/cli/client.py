@@ -0,0 +1,146 @@
+"""
+Shared API client for the CLIs
+--------------------------------------------------
+One pooled `httpx.AsyncClient` plus a crash-safe note spool.
+
+Notes are not sent one request at a time. `NoteSpool.add()` appends each
+note to a local JSONL file (fsync'd) and `flush()` sends everything pending
+in one `POST /sessions/{sid}/notes` at the next stage boundary. Every note
+carries a client id, so a flush retried after a lost response is not
+stored twice. Notes that could not be sent (API unreachable or answering
+5xx) stay in the spool and go out with the next flush, or on the next CLI
+start (`flush_pending()`). A spool the API refuses for good (4xx, e.g.
+the session is gone or already finished) is moved to `rejected/` so it is
+not resent forever.
+"""
+import os, json, uuid, asyncio, logging
+from pathlib import Path
+import httpx
+
+API_ROOT  = os.getenv("RV_API", "http://127.0.0.1:8000")
+SPOOL_DIR = Path(os.getenv("RV_NOTE_SPOOL", "app/data/spool"))
+
+logger = logging.getLogger(__name__)
+client = httpx.AsyncClient()
+
+async def post(path, **kw): return (await client.post(f"{API_ROOT}{path}", **kw)).json()
+async def get (path, **kw): return (await client.get (f"{API_ROOT}{path}", **kw)).json()
+
+def _retryable(e: httpx.HTTPError) -> bool:
+    """Connection problems and 5xx (e.g. a restarting server) are worth retrying"""
+    return (isinstance(e, httpx.TransportError) or
+            isinstance(e, httpx.HTTPStatusError) and e.response.status_code >= 500)
+
+async def wait_for_result(sid, wait:int=60) -> dict:
+    """Long-poll until the session is scored or failed; the API answers the moment it is"""
+    while True:
+        ses = await get(f"/sessions/{sid}/result", params={"wait": wait}, timeout=wait + 15)
+        if ses["status"] in ("scored", "failed"):
+            return ses
+
+class NoteSpool:
+    """A session's unsent notes, in an append-only JSONL file
+
+    Lines are either a note (``{"id", "stage", "text"}``) or an
+    acknowledgement (``{"ack": [ids]}``). The file is removed once every
+    note in it has been acknowledged.
+    """
+
+    def __init__(self, sid: int, root: Path = SPOOL_DIR):
+        self.sid = sid
+        self.path = Path(root) / f"session-{sid}.jsonl"
+        self._pending: dict[str, dict] = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn last line from a crash mid-write
+                    if "ack" in entry:
+                        for i in entry["ack"]:
+                            self._pending.pop(i, None)
+                    else:
+                        self._pending[entry["id"]] = entry
+
+    def _append(self, entry: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _reject(self, e: httpx.HTTPStatusError):
+        """Move the spool aside after a permanent 4xx so it isn't resent on every start"""
+        dest = self.path.parent / "rejected" / self.path.name
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(self.path, dest)
+        self._pending.clear()
+        logger.error(f"API refused notes for session {self.sid} "
+                     f"({e.response.status_code}); moved them to {dest}")
+
+    def add(self, stage: int, text: str):
+        """Record a note locally; it is sent by the next flush()"""
+        entry = {"id": uuid.uuid4().hex, "stage": stage, "text": text}
+        self._append(entry)
+        self._pending[entry["id"]] = entry
+
+    @property
+    def pending(self) -> list[dict]:
+        return list(self._pending.values())
+
+    async def flush(self) -> bool:
+        """Send all pending notes in one request
+
+        Returns False if notes are still waiting because the API was
+        unreachable or failing; never raises for HTTP errors.
+        """
+        notes = self.pending
+        if not notes:
+            return True
+        body = {"notes": [{"client_id": n["id"], "stage": n["stage"], "text": n["text"]}
+                          for n in notes]}
+        try:
+            r = await client.post(f"{API_ROOT}/sessions/{self.sid}/notes", json=body)
+            r.raise_for_status()
+        except httpx.HTTPError as e:
+            if _retryable(e):
+                logger.warning(f"Notes for session {self.sid} kept in {self.path}: {e}")
+                return False
+            self._reject(e)
+            return True
+        for n in notes:
+            self._pending.pop(n["id"], None)
+        if self._pending:
+            self._append({"ack": [n["id"] for n in notes]})
+        else:
+            self.path.unlink(missing_ok=True)
+        return True
+
+async def finish_session(spool: NoteSpool, attempts: int = 5) -> bool:
+    """Flush the remaining notes and queue the session for scoring, with retries
+
+    Both requests are retried with backoff on connection errors and 5xx
+    (finish is idempotent). Returns False if the API stayed unreachable;
+    the notes remain spooled.
+    """
+    for attempt in range(attempts):
+        if await spool.flush():
+            try:
+                r = await client.post(f"{API_ROOT}/sessions/{spool.sid}/finish")
+                r.raise_for_status()
+                return True
+            except httpx.HTTPError as e:
+                if not _retryable(e):
+                    raise
+                logger.warning(f"Finishing session {spool.sid} failed: {e}")
+        await asyncio.sleep(min(2 ** attempt, 10))
+    return False
+
+async def flush_pending(root: Path = SPOOL_DIR) -> int:
+    """Send notes left over from earlier runs; returns how many sessions were flushed"""
+    flushed = 0
+    for path in sorted(Path(root).glob("session-*.jsonl")):
+        if await NoteSpool(int(path.stem.split("-", 1)[1]), root).flush():
+            flushed += 1
+    return flushed
@@ -1,7 +1,8 @@
+import asyncio
 import typer
 from rich import print
 import httpx
-import time
+from app.cli.client import NoteSpool, finish_session
 from typing import Optional
 
 app = typer.Typer()
@@ -22,25 +23,28 @@ def new():
         
         print(f"[green]Session {sid} – TRN {trn}[/]")
         
-        # Collect impressions
+        # Collect impressions (spooled to disk, sent in one batch on finish)
+        spool = NoteSpool(sid)
         stage = 1
         while True:
             txt = typer.prompt("note (blank = finish)")
             if not txt:
                 break
-            
-            # Add note to session
-            response = httpx.post(f"{API}/sessions/{sid}/note", json={"text": txt, "stage": stage})
-            response.raise_for_status()
+            spool.add(stage, txt)
             stage += 1
         
         # Finish session
         print("[yellow]Finishing session and scoring... (this may take a moment)[/]")
-        response = httpx.post(f"{API}/sessions/{sid}/finish")
-        response.raise_for_status()
+        if not asyncio.run(finish_session(spool)):
+            print(f"[red]API unreachable. Your notes are saved in {spool.path}.[/]")
+            return
         
-        # Wait for scoring to complete (could add polling here)
-        time.sleep(5)
+        # Long-poll: the API answers as soon as scoring is done
+        while True:
+            response = httpx.get(f"{API}/sessions/{sid}/result", params={"wait": 60}, timeout=75)
+            response.raise_for_status()
+            if response.json()["status"] in ("scored", "failed"):
+                break
         show(sid)
     except httpx.HTTPStatusError as e:
         print(f"[red]Error: API returned status code {e.response.status_code}[/]")
@@ -74,6 +78,8 @@ def show(session_id: int = typer.Argument(None)):
             print("\n[bold]Rubric:[/]")
             for k, v in session["rubric"].items():
                 print(f"- {k}: {v:.1f}%")
+        elif session.get("status") == "failed":
+            print("[red]Scoring failed for this session.[/]")
         else:
             print("[yellow]This session has not been scored yet.[/]")
         
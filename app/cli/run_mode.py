@@ -6,7 +6,7 @@ Ultra-Explicit Guided "Run Mode"
 • Detailed debrief table + plain-English tip
 """
 
-import asyncio, os, sys, time, json, httpx
+import asyncio, sys, time, json
 from datetime import datetime
 from rich.console   import Console
 from rich.panel     import Panel
@@ -17,17 +17,14 @@ from rich.progress  import (
 )
 from rich.table     import Table
 
+from app.cli.client    import (post, get, wait_for_result, NoteSpool,
+                               finish_session, flush_pending)
+
 # ── Configuration ───────────────────────────────────────────────────────
-API_ROOT   = os.getenv("RV_API", "http://127.0.0.1:8000")
 BELL       = "\a"   # terminal bell
 console    = Console()
-client     = httpx.AsyncClient()
 PAD        = "  "
 
-# ── Mini HTTP helpers ───────────────────────────────────────────────────
-async def post(path, **kw): return (await client.post(f"{API_ROOT}{path}", **kw)).json()
-async def get (path, **kw): return (await client.get (f"{API_ROOT}{path}", **kw)).json()
-
 # ── UI helpers ──────────────────────────────────────────────────────────
 def ring(): console.print(BELL, end="", soft_wrap=True)
 
@@ -84,8 +81,11 @@ async def _run_async():
         "Press ↵ Enter to begin")
     input()
 
-    # Resume or create session
-    unfinished = await get("/sessions?status=unfinished")
+    # Notes a crashed run couldn't send go out first
+    await flush_pending()
+
+    # Resume the most recent open session, or create one
+    unfinished = (await get("/sessions", params={"status": "open", "limit": 1}))["sessions"]
     if unfinished:
         s   = unfinished[0]
         sid = s["session_id"]; trn = s["target_id"]
@@ -94,6 +94,8 @@ async def _run_async():
         trn = (await post("/targets/random"))["trn"]
         sid = (await post("/sessions", json={"trn": trn}))["session_id"]
         console.print(f"New session [bold]{sid}[/] created  •  TRN {trn}\n")
+    # Notes are kept on disk and sent in batches at stage boundaries
+    spool = NoteSpool(sid)
 
     # Stage definitions
     stages = [
@@ -118,7 +120,8 @@ async def _run_async():
         show_panel(title, f"{desc}\n\n[dim]{example}",
                    footer="Type your words, ↵ to submit  •  'skip' to skip")
         answer = await ask_user("Your entry", allow_blank=True)
-        await post(f"/sessions/{sid}/note", json={"stage": idx, "text": answer})
+        spool.add(idx, answer)
+        await spool.flush()
         if answer.lower() != "skip": countdown(seconds)
 
     # Probes (yes/no/unsure)
@@ -131,29 +134,31 @@ async def _run_async():
     ]
     for i,q in enumerate(probe_qs, 1):
         a = Prompt.ask(f"{q}", choices=["y","n","u"], default="u")
-        await post(f"/sessions/{sid}/note",
-                   json={"stage": 5, "text": f"{q} → {a}"})
+        spool.add(5, f"{q} → {a}")
+    await spool.flush()
 
     # Summary
     show_panel("Stage 6 – Summary",
                "In ONE or TWO sentences, combine your strongest impressions.\n"
                "Optional: paste sketch file path (or blank to skip).")
     summary = await ask_user("Summary (blank = none)", allow_blank=True)
-    await post(f"/sessions/{sid}/note",
-               json={"stage": 6, "text": summary})
+    spool.add(6, summary)
 
     # Lock & score
     console.print("\n[bold]Locking notes and contacting GPT-Vision…[/]")
-    await post(f"/sessions/{sid}/finish")
+    if not await finish_session(spool):
+        console.print(f"[red]API unreachable. Your notes are saved in {spool.path} "
+                      "and will be sent next time you run rv.[/]")
+        return
     with Progress(SpinnerColumn(),
                   "[progress.description]{task.description}",
                   console=console, transient=True) as prog:
-        t = prog.add_task("Scoring", start=False)
-        while True:
-            ses = await get(f"/sessions/{sid}")
-            if ses["total_score"] > 0:
-                break
-            prog.start_task(t); time.sleep(1)
+        prog.add_task("Scoring")
+        ses = await wait_for_result(sid)
+    if ses["status"] == "failed":
+        console.print("[red]Scoring failed. Your notes are saved; "
+                      f"finish session {sid} again later to retry.[/]")
+        return
 
     # Debrief
     rubric = ses["rubric"]; total = ses["total_score"]
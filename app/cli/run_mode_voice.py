@@ -1,13 +1,9 @@
-import asyncio, os, time, json, httpx
+import asyncio, json
 from rich.console import Console
 from app.services.voice import speak, listen
 from app.cli.run_mode import countdown     # reuse timer helper
-API = os.getenv("RV_API", "http://127.0.0.1:8000")
+from app.cli.client import post, wait_for_result, NoteSpool, finish_session, flush_pending
 console = Console()
-client  = httpx.AsyncClient()
-
-async def post(path, **k): return (await client.post(f"{API}{path}", **k)).json()
-async def get (path, **k): return (await client.get (f"{API}{path}", **k)).json()
 
 async def voice_run():
     # Introduction with detailed explanation
@@ -25,8 +21,10 @@ async def voice_run():
     await asyncio.sleep(3)
     
     # Generate new target and create session
+    await flush_pending()
     trn = (await post("/targets/random"))["trn"]
     sid = (await post("/sessions", json={"trn": trn}))["session_id"]
+    spool = NoteSpool(sid)
     console.print(f"Voice session {sid} • TRN {trn}")
     
     await speak(
@@ -92,14 +90,15 @@ async def voice_run():
 
     # Run through each stage with improved interaction
     for prompt, secs, num in stages:
-        await speak(prompt)
+        await asyncio.gather(speak(prompt), spool.flush())
         
         # Listen for response with commands handling
         txt = (await listen(seconds=secs+10)).lower()
         
         # Handle commands
         if "cancel" in txt:
-            await speak("Session cancelled. Your progress has been saved. Thank you for participating.")
+            await asyncio.gather(spool.flush(), speak(
+                "Session cancelled. Your progress has been saved. Thank you for participating."))
             return
         elif "help" in txt:
             if num == 1:
@@ -114,11 +113,12 @@ async def voice_run():
             await speak(help_text)
             txt = (await listen(seconds=secs)).lower()
             if "cancel" in txt:
-                await speak("Session cancelled. Your progress has been saved. Thank you for participating.")
+                await asyncio.gather(spool.flush(), speak(
+                    "Session cancelled. Your progress has been saved. Thank you for participating."))
                 return
         
-        # Save the response
-        await post(f"/sessions/{sid}/note", json={"stage":num, "text":txt})
+        # Save the response (sent while the next prompt is spoken)
+        spool.add(num, txt)
         
         # Countdown timer if not skipped
         if "skip" not in txt: 
@@ -128,13 +128,13 @@ async def voice_run():
             await speak("Moving to the next stage.")
 
     # Stage 5: Probes with better explanation
-    await speak(
+    await asyncio.gather(spool.flush(), speak(
         "Stage Five: Targeted probes. "
         "I'll ask you three specific questions about the target. "
         "Answer quickly with 'yes', 'no', or 'unsure'. "
         "These probes help focus on specific aspects of the target. "
         "Trust your intuitive response without analyzing."
-    )
+    ))
     
     probes = [
         "Is the dominant environment indoors?",
@@ -154,21 +154,21 @@ async def voice_run():
         else:
             simplified = "unsure"
             
-        await post(f"/sessions/{sid}/note", json={"stage":5, "text":f"{q} → {simplified}"})
+        spool.add(5, f"{q} → {simplified}")
         await speak(f"Recorded: {simplified}")
 
     # Stage 6: Summary with better guidance
-    await speak(
+    await asyncio.gather(spool.flush(), speak(
         "Stage Six: Summary. "
         "This is your opportunity to bring together all your impressions. "
         "What stands out most strongly from your session? "
         "Synthesize your key impressions from all stages into one or two sentences. "
         "This summary helps consolidate your perceptions of the target. "
         "Take a moment to review your notes if needed, then provide your summary."
-    )
+    ))
     
     summary = await listen(seconds=90)
-    await post(f"/sessions/{sid}/note", json={"stage":6, "text":summary})
+    spool.add(6, summary)
 
     # Scoring process with explanation
     await speak(
@@ -178,11 +178,13 @@ async def voice_run():
         "Please wait a moment while this analysis is completed."
     )
     
-    await post(f"/sessions/{sid}/finish")
-    while True:
-        ses = await get(f"/sessions/{sid}")
-        if ses["total_score"]>0: break
-        time.sleep(1)
+    if not await finish_session(spool):
+        await speak("I can't reach the server right now. Your notes are saved and will be sent next time.")
+        return
+    ses = await wait_for_result(sid)
+    if ses["status"] == "failed":
+        await speak("Sorry, scoring failed. Your notes are saved, so you can finish this session again later.")
+        return
 
     # Detailed feedback
     total_score = ses["total_score"]
@@ -0,0 +1,91 @@
+import os, time, logging, threading
+from collections import deque
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ───────────────────────────────────────────────────────
+POOL_OPTIONS = {
+    "pool_size":     int(os.getenv("RV_DB_POOL_SIZE", "5")),
+    "max_overflow":  int(os.getenv("RV_DB_MAX_OVERFLOW", "10")),
+    "pool_timeout":  float(os.getenv("RV_DB_POOL_TIMEOUT", "30")),
+    # Recycle before typical server/proxy idle timeouts drop the connection
+    "pool_recycle":  int(os.getenv("RV_DB_POOL_RECYCLE", "1800")),
+    "pool_pre_ping": os.getenv("RV_DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes"),
+}
+# Log a warning when waiting for a connection takes longer than this
+SLOW_CHECKOUT_MS = float(os.getenv("RV_DB_SLOW_CHECKOUT_MS", "100"))
+
+class CheckoutStats:
+    """Connection checkout wait times for one pool (thread-safe)"""
+
+    def __init__(self, name: str, window: int = 1000):
+        self.name = name
+        self.checkouts = 0
+        self.slow = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, ms: float, pool):
+        with self._lock:
+            self.checkouts += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+            self._recent.append(ms)
+            if ms >= SLOW_CHECKOUT_MS:
+                self.slow += 1
+        if ms >= SLOW_CHECKOUT_MS:
+            logger.warning(f"DB pool '{self.name}' checkout waited {ms:.0f} ms "
+                           f"({pool.checkedout()} in use, overflow {max(0, pool.overflow())})")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = np.array(self._recent) if self._recent else np.zeros(1)
+            return {
+                "checkouts": self.checkouts,
+                "slow_checkouts": self.slow,
+                "wait_mean_ms": round(self.total_ms / self.checkouts, 3) if self.checkouts else 0.0,
+                "wait_p50_ms": round(float(np.percentile(recent, 50)), 3),
+                "wait_p99_ms": round(float(np.percentile(recent, 99)), 3),
+                "wait_max_ms": round(self.max_ms, 3),
+            }
+
+class _TimedCheckout:
+    """Pool mixin that times every checkout: queuing plus any new connect"""
+    stats: CheckoutStats
+
+    def __init__(self, *args, max_overflow: int = 10, **kw):
+        super().__init__(*args, max_overflow=max_overflow, **kw)
+        # The pool has no public accessor, so keep the configured value
+        self.max_overflow = max_overflow
+
+    def _do_get(self):
+        start = time.perf_counter()
+        conn = super()._do_get()
+        self.stats.record((time.perf_counter() - start) * 1000, self)
+        return conn
+
+def timed_pool(base: type, name: str) -> type:
+    """A subclass of ``base`` (QueuePool or AsyncAdaptedQueuePool) with checkout timing
+
+    The stats live on the class, so they survive ``engine.dispose()``,
+    which rebuilds the pool from its class.
+    """
+    return type(f"Timed{base.__name__}", (_TimedCheckout, base), {"stats": CheckoutStats(name)})
+
+def pool_metrics(engine) -> dict:
+    """Current pool occupancy plus checkout wait statistics"""
+    pool = engine.pool
+    metrics = {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "idle": pool.checkedin(),
+        # SQLAlchemy counts overflow up from -size; report only real overflow
+        "overflow": max(0, pool.overflow()),
+    }
+    if isinstance(pool, _TimedCheckout):
+        metrics["max_overflow"] = pool.max_overflow
+        metrics.update(pool.stats.snapshot())
+    return metrics
@@ -1,8 +1,12 @@
 import os
 from sqlalchemy import create_engine
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
 from dotenv import load_dotenv
-from contextlib import contextmanager
+from app.db.pool import POOL_OPTIONS, timed_pool
+from contextlib import contextmanager, asynccontextmanager
 
 # Load environment variables
 load_dotenv()
@@ -11,13 +15,31 @@ load_dotenv()
 user = os.getenv("USER", os.getenv("USERNAME", "postgres"))
 db_url = os.getenv("DATABASE_URL", f"postgresql://{user}@localhost:5432/rv")
 
-# Convert from asyncpg URL if needed
-if "asyncpg" in db_url:
-    db_url = db_url.replace("asyncpg", "psycopg")
+def _async_url(url: str) -> str:
+    """Point a postgresql URL at the asyncpg driver"""
+    scheme, rest = url.split("://", 1)
+    if scheme.split("+")[0] in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
 
-engine = create_engine(db_url, echo=False)
+# Blocking engine for Alembic, scripts and background jobs
+# (convert from an asyncpg URL if needed)
+sync_url = db_url.replace("asyncpg", "psycopg")
+engine = create_engine(sync_url, echo=False, poolclass=timed_pool(QueuePool, "sync"),
+                       **POOL_OPTIONS)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Async engine (asyncpg) for the API routes
+async_url = _async_url(db_url)
+async_engine = create_async_engine(async_url, echo=False,
+                                   poolclass=timed_pool(AsyncAdaptedQueuePool, "async"),
+                                   **POOL_OPTIONS)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+def dialect_insert(db, table):
+    """INSERT for the session's dialect, so ON CONFLICT clauses are available"""
+    return (sqlite if db.get_bind().dialect.name == "sqlite" else postgresql).insert(table)
+
 # This is for use with 'with' statements
 @contextmanager
 def get_db():
@@ -41,4 +63,19 @@ def get_db_session():
         db.rollback()
         raise
     finally:
-        db.close() 
\ No newline at end of file
+        db.close() 
+
+@asynccontextmanager
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        try:
+            yield db
+            await db.commit()
+        except Exception:
+            await db.rollback()
+            raise
+
+# FastAPI Depends for async routes
+async def get_async_db_session() -> AsyncSession:
+    async with get_async_db() as db:
+        yield db
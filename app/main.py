@@ -1,3 +1,22 @@
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+
+# Load environment variables before the app modules read their settings
+load_dotenv()
+
 from fastapi import FastAPI
 from app.api.routes import router
-app = FastAPI(title="RV-CLI API"); app.include_router(router) 
\ No newline at end of file
+from app.db.session import async_engine
+from app.services import events, pipeline, target_pool, targets
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    target_pool.start_refill()
+    events.start()
+    yield
+    await events.stop()
+    pipeline.shutdown()
+    await targets.close_http_client()
+    await async_engine.dispose()
+
+app = FastAPI(title="RV-CLI API", lifespan=lifespan); app.include_router(router)
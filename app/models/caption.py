@@ -0,0 +1,10 @@
+from sqlalchemy import String, JSON, TIMESTAMP
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+class ImageCaption(Base):
+    """Vision captions memoized by image content, see app.services.captions"""
+    __tablename__ = "image_captions"
+    image_hash:      Mapped[str]  = mapped_column(String, primary_key=True)
+    caption_version: Mapped[str]  = mapped_column(String, primary_key=True)
+    caption:         Mapped[dict] = mapped_column(JSON)
+    created_at:      Mapped[str]  = mapped_column(TIMESTAMP, server_default="NOW()")
@@ -0,0 +1,23 @@
+from sqlalchemy import Integer, String, TIMESTAMP, ForeignKey, Index, text
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+class ScoringJob(Base):
+    """A durable "score this session" job, see app.services.jobs"""
+    __tablename__ = "scoring_jobs"
+    job_id:          Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    session_id:      Mapped[int] = mapped_column(ForeignKey("sessions.session_id", ondelete="CASCADE"))
+    # One job per key; a repeated finish with the same key returns the same job
+    idempotency_key: Mapped[str] = mapped_column(String, unique=True)
+    # queued → running → done, or back to queued for a retry, or dead
+    status:          Mapped[str] = mapped_column(String, server_default="queued")
+    attempts:        Mapped[int] = mapped_column(Integer, server_default="0")
+    # When a queued job may next run; for a running job, when its lease expires
+    run_at:          Mapped[str] = mapped_column(TIMESTAMP)
+    locked_by:       Mapped[str] = mapped_column(String, nullable=True)
+    last_error:      Mapped[str] = mapped_column(String, nullable=True)
+    created_at:      Mapped[str] = mapped_column(TIMESTAMP, server_default="NOW()")
+    finished_at:     Mapped[str] = mapped_column(TIMESTAMP, nullable=True)
+    __table_args__ = (
+        Index("idx_scoring_jobs_due", "run_at",
+              postgresql_where=text("status IN ('queued', 'running')")),
+    )
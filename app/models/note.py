@@ -0,0 +1,16 @@
+from sqlalchemy import Integer, String, TIMESTAMP, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from .base import Base
+class SessionNote(Base):
+    """One note per row, appended as the user works through the stages"""
+    __tablename__ = "session_notes"
+    # Global insert order; notes are read back per session in seq order
+    seq:        Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    session_id: Mapped[int] = mapped_column(ForeignKey("sessions.session_id", ondelete="CASCADE"))
+    stage:      Mapped[int] = mapped_column(Integer)
+    text:       Mapped[str] = mapped_column(String)
+    # Set by clients that batch notes, so a retried batch is stored once
+    client_id:  Mapped[str | None] = mapped_column(String, nullable=True)
+    created_at: Mapped[str] = mapped_column(TIMESTAMP, server_default="NOW()")
+    __table_args__ = (Index("idx_session_notes_session", "session_id", "seq"),
+                      Index("uq_session_notes_client", "session_id", "client_id", unique=True))
@@ -1,14 +1,26 @@
-from sqlalchemy import Float, JSON, TIMESTAMP, ForeignKey, String
+import numpy as np
+from sqlalchemy import Float, JSON, TIMESTAMP, ForeignKey, String, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
 from .base import Base
+from .types import PackedVectors
 class Session(Base):
     __tablename__ = "sessions"
     session_id:      Mapped[int]   = mapped_column(primary_key=True, autoincrement=True)
     target_id:       Mapped[str]   = mapped_column(String, ForeignKey("targets.target_id"))
+    # Empty since notes moved to session_notes; see app.services.notes
     user_notes:      Mapped[str]   = mapped_column(String)
     sketch_path:     Mapped[str]   = mapped_column(String, nullable=True)
     stage_durations: Mapped[dict]  = mapped_column(JSON)
     rubric:          Mapped[dict]  = mapped_column(JSON)
     total_score:     Mapped[float] = mapped_column(Float)
+    # open → scoring → scored | failed (a failed session can be finished again)
+    status:          Mapped[str]   = mapped_column(String, server_default="open")
     aols:            Mapped[list]  = mapped_column(JSON)
-    ts:              Mapped[str]   = mapped_column(TIMESTAMP, server_default="NOW()") 
\ No newline at end of file
+    ts:              Mapped[str]   = mapped_column(TIMESTAMP, server_default="NOW()")
+    # Embedding of the scored transcript, reused by app.services.stats
+    notes_embedding:       Mapped[np.ndarray] = mapped_column(PackedVectors(), nullable=True)
+    notes_embedding_model: Mapped[str] = mapped_column(String, nullable=True)
+    __table_args__ = (
+        Index("idx_sessions_open", "session_id", postgresql_where=text("status = 'open'")),
+        Index("idx_sessions_scoring", "session_id", postgresql_where=text("status = 'scoring'")),
+    )
@@ -1,9 +1,23 @@
-from sqlalchemy import String, JSON, TIMESTAMP
+import numpy as np
+from sqlalchemy import String, JSON, TIMESTAMP, Index, text
 from sqlalchemy.orm import Mapped, mapped_column
 from .base import Base
+from .types import PackedVectors
 class Target(Base):
     __tablename__ = "targets"
     target_id: Mapped[str] = mapped_column(String, primary_key=True)
     image_url:  Mapped[str] = mapped_column(String)
     caption:    Mapped[dict] = mapped_column(JSON)
-    created_at: Mapped[str] = mapped_column(TIMESTAMP, server_default="NOW()") 
\ No newline at end of file
+    # pending → ready | failed; the caption is only meaningful when "ready"
+    caption_status: Mapped[str] = mapped_column(String, server_default="pending")
+    image_hash:     Mapped[str] = mapped_column(String, nullable=True)
+    # Per-target description/category vectors, see app.services.score.target_vectors
+    embeddings:      Mapped[np.ndarray] = mapped_column(PackedVectors(), nullable=True)
+    embedding_model: Mapped[str] = mapped_column(String, nullable=True)
+    caption_hash:    Mapped[str] = mapped_column(String, nullable=True)
+    created_at: Mapped[str] = mapped_column(TIMESTAMP, server_default="NOW()")
+    # NULL while the target waits in the pool, set when a session claims it
+    claimed_at: Mapped[str] = mapped_column(TIMESTAMP, nullable=True)
+    __table_args__ = (
+        Index("idx_targets_pool", "created_at", postgresql_where=text("claimed_at IS NULL")),
+    ) 
\ No newline at end of file
@@ -0,0 +1,69 @@
+import os, struct
+import numpy as np
+from sqlalchemy import LargeBinary
+from sqlalchemy.types import TypeDecorator
+
+# float32 by default; float16 halves storage at ~3 significant digits
+EMBED_DTYPE = os.getenv("RV_EMBED_DTYPE", "float32")
+
+# Every blob starts with a 4-byte header: dtype code ("f4"/"f2") + uint16 dim.
+# Four bytes keep the payload aligned for both float32 and float16.
+HEADER = struct.Struct("<2sH")
+DTYPES = {b"f4": np.dtype("<f4"), b"f2": np.dtype("<f2")}
+
+def pack_vectors(vectors, dtype=EMBED_DTYPE) -> bytes:
+    """Pack a vector or a (rows, dim) matrix into a self-describing blob"""
+    arr = np.asarray(vectors, dtype=np.dtype(dtype).newbyteorder("<"))
+    if arr.ndim == 1:
+        arr = arr[None, :]
+    code = next(c for c, d in DTYPES.items() if d == arr.dtype)
+    return HEADER.pack(code, arr.shape[1]) + arr.tobytes()
+
+def unpack_vectors(blob) -> np.ndarray:
+    """View a blob as a read-only (rows, dim) array without copying it"""
+    code, dim = HEADER.unpack_from(blob)
+    return np.frombuffer(blob, dtype=DTYPES[code], offset=HEADER.size).reshape(-1, dim)
+
+def unpack_many(blobs) -> np.ndarray:
+    """Load many same-shaped blobs as one (n, rows, dim) array
+
+    The blobs are joined into one buffer, which copies the data once; the
+    result is a strided view over that buffer that skips the headers, so
+    there is no per-row parsing. Mixed dtypes fall back to a per-row load
+    cast to float32.
+    """
+    blobs = list(blobs)
+    if not blobs:
+        return np.empty((0, 0, 0), dtype=np.float32)
+    headers = {bytes(b[:HEADER.size]) for b in blobs}
+    sizes = {len(b) for b in blobs}
+    if len(headers) > 1 or len(sizes) > 1:
+        return np.stack([unpack_vectors(b).astype(np.float32) for b in blobs])
+    code, dim = HEADER.unpack(headers.pop())
+    dtype = DTYPES[code]
+    skip = HEADER.size // dtype.itemsize
+    flat = np.frombuffer(b"".join(blobs), dtype=dtype).reshape(len(blobs), -1)
+    return flat[:, skip:].reshape(len(blobs), -1, dim)
+
+class PackedVectors(TypeDecorator):
+    """Embedding vectors stored as packed binary (BYTEA) instead of JSON
+
+    Binds any array-like of shape (dim,) or (rows, dim); loads as a
+    read-only NumPy (rows, dim) view over the fetched bytes.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, dtype: str = EMBED_DTYPE):
+        super().__init__()
+        self.dtype = dtype
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return pack_vectors(value, self.dtype)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return unpack_vectors(value)
@@ -1,72 +1,167 @@
-import os, json, base64, numpy as np, openai
+import os, json, time, base64, hashlib, numpy as np
+from pathlib import Path
+from typing import NamedTuple
 from PIL import Image
 from io import BytesIO
 from dotenv import load_dotenv
 import logging
+from app.services.embed_cache import get_cache, normalize
+from app.services.embedders import get_backend
+from app.services import openai_client
 
-# Load environment variables to get API key
+# Load environment variables
 load_dotenv()
-openai.api_key = os.getenv("OPENAI_API_KEY")
 
 logger = logging.getLogger(__name__)
 
+# Longest edge sent to the vision model; 512 fits a single low-detail tile
+VISION_MAX_EDGE     = int(os.getenv("RV_VISION_MAX_EDGE", "512"))
+VISION_JPEG_QUALITY = int(os.getenv("RV_VISION_JPEG_QUALITY", "85"))
+VISION_MODEL        = "gpt-4o"
+CAPTION_PROMPT      = "Return JSON with keys: objects, colors, shapes, materials, setting."
+# Formats the vision API accepts as-is, with their MIME types
+PASSTHROUGH_FORMATS = {"JPEG": "image/jpeg", "PNG": "image/png",
+                       "WEBP": "image/webp", "GIF": "image/gif"}
+
+def embedding_model() -> str:
+    """Name of the embedding model in use (see app.services.embedders)"""
+    return get_backend().model
+
 def embed(text: str) -> list[float]:
-    """Generate embeddings for text using OpenAI's API"""
-    r = openai.embeddings.create(
-        model="text-embedding-3-small",
-        input=text, 
-        encoding_format="float"
-    )
-    return r.data[0].embedding
+    """Generate embeddings for text using the configured backend"""
+    return embed_many([text])[0]
 
-def describe_image(path: str) -> dict:
-    """Generate a description of an image using GPT-4 Vision"""
-    # Verify the image exists and is valid
-    try:
-        if not os.path.exists(path):
-            logger.error(f"Image file does not exist: {path}")
-            return _get_fallback_description()
-            
-        # Check if file is empty
-        if os.path.getsize(path) == 0:
-            logger.error(f"Image file is empty (0 bytes): {path}")
-            return _get_fallback_description()
-        
-        # Load and convert the image to base64
-        img = Image.open(path)
-        # Verify it's a valid image
+def embed_many(texts: list[str]) -> list[list[float]]:
+    """Generate embeddings for several texts in a single backend request
+
+    Results are returned in the same order as ``texts``. Vectors already in
+    the embedding cache are served from disk; only the misses are sent to
+    the backend, and they are stored for next time. Misses are embedded in
+    their normalized form (the cache key), so every spelling that maps to a
+    key gets the same vector.
+    """
+    if not texts:
+        return []
+    backend = get_backend()
+    cache = get_cache() if backend.cacheable else None
+    if cache is None:
+        return backend.embed_batch(texts)
+
+    vectors = cache.get_many(backend.model, texts)
+    missing = list(dict.fromkeys(normalize(t) for i, t in enumerate(texts) if i not in vectors))
+    if missing:
+        fetched = backend.embed_batch(missing)
+        cache.put_many(backend.model, missing, fetched)
+        # Round-trip through float32 so hits and misses return identical values
+        fetched = dict(zip(missing, (np.asarray(v, dtype=np.float32).tolist() for v in fetched)))
+        for i, t in enumerate(texts):
+            if i not in vectors:
+                vectors[i] = fetched[normalize(t)]
+    return [vectors[i] for i in range(len(texts))]
+
+def embed_cached(texts: list[str]) -> dict[int, list[float]]:
+    """Return only the embeddings already available without a network call
+
+    Keyed by index in ``texts``. Backends that are not cached (the local
+    one) are cheap enough to just run.
+    """
+    backend = get_backend()
+    if not texts:
+        return {}
+    if not backend.cacheable:
+        return dict(enumerate(backend.embed_batch(texts)))
+    cache = get_cache()
+    return cache.get_many(backend.model, texts) if cache else {}
+
+class PreparedImage(NamedTuple):
+    data: bytes
+    mime: str
+    detail: str         # vision "detail" level matching the sent resolution
+    size: tuple         # (width, height) actually sent
+    reencoded: bool
+    encode_ms: float
+
+def prepare_image(path: str, max_edge: int = VISION_MAX_EDGE) -> PreparedImage:
+    """Get an image ready for the vision API with as little work as possible
+
+    The file is read once. If it is already in a format the API accepts
+    and fits within ``max_edge``, its original compressed bytes are sent
+    as-is (after a structural check). Otherwise it is downscaled to fit and
+    encoded as JPEG. ``detail`` is "low" when the sent image fits in the
+    512px low-detail tile and "high" otherwise, so we never pay for
+    high-detail tokens on a small image.
+    """
+    t = time.perf_counter()
+    data = Path(path).read_bytes()
+    img = Image.open(BytesIO(data))
+    fmt, size = img.format, img.size
+    if fmt in PASSTHROUGH_FORMATS and max(size) <= max_edge \
+            and not getattr(img, "is_animated", False):
         img.verify()
-        # Reopen after verify (verify closes the file)
-        img = Image.open(path)
+        reencoded = False
+    else:
+        # draft() lets JPEG decode at a reduced scale, skipping most of the work
+        img.draft("RGB", (max_edge, max_edge))
+        img = img.convert("RGB")
+        img.thumbnail((max_edge, max_edge), Image.LANCZOS)
         buf = BytesIO()
-        img.save(buf, "PNG")
-        b64 = base64.b64encode(buf.getvalue()).decode()
-        
-        # Prepare message for GPT-4 Vision
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "text", "text": "Return JSON with keys: objects, colors, shapes, materials, setting."},
-                    {"type": "image_url", "image_url": {"url": f"data:image/png;base64,{b64}"}}
-                ]
-            }
-        ]
-        
-        # Call the OpenAI API
-        r = openai.chat.completions.create(
-            model="gpt-4o",
-            messages=messages,
-            max_tokens=256
-        )
-        
-        # Parse and return the JSON response
-        try:
-            return json.loads(r.choices[0].message.content)
-        except json.JSONDecodeError:
-            logger.error(f"Failed to parse JSON response from OpenAI API")
-            return _get_fallback_description()
-            
+        img.save(buf, "JPEG", quality=VISION_JPEG_QUALITY, optimize=True)
+        data, fmt, size, reencoded = buf.getvalue(), "JPEG", img.size, True
+    encode_ms = (time.perf_counter() - t) * 1000
+    logger.info(f"Prepared {path} for vision: {size[0]}x{size[1]} {fmt}, {len(data)} bytes, "
+                f"{'re-encoded' if reencoded else 'original bytes'}, {encode_ms:.1f} ms")
+    return PreparedImage(data=data, mime=PASSTHROUGH_FORMATS[fmt], size=size,
+                         detail="low" if max(size) <= 512 else "high",
+                         reencoded=reencoded, encode_ms=encode_ms)
+
+def caption_version() -> str:
+    """Identifies the vision model + prompt; captions are cached per version"""
+    prompt = hashlib.sha256(f"{CAPTION_PROMPT}|{VISION_MAX_EDGE}".encode()).hexdigest()[:12]
+    return f"{VISION_MODEL}/{prompt}"
+
+def caption_image(path: str) -> dict:
+    """Describe an image with GPT-4 Vision; raises if anything goes wrong"""
+    # Verify the image exists and is valid
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"Image file does not exist: {path}")
+
+    # Check if file is empty
+    if os.path.getsize(path) == 0:
+        raise ValueError(f"Image file is empty (0 bytes): {path}")
+
+    # Send the original bytes when possible, otherwise a downscaled JPEG
+    img = prepare_image(path)
+    b64 = base64.b64encode(img.data).decode()
+
+    # Prepare message for GPT-4 Vision
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "text", "text": CAPTION_PROMPT},
+                {"type": "image_url", "image_url": {"url": f"data:{img.mime};base64,{b64}",
+                                                    "detail": img.detail}}
+            ]
+        }
+    ]
+
+    # Call the OpenAI API
+    r = openai_client.run("chat", lambda c: c.chat.completions.create(
+        model=VISION_MODEL,
+        messages=messages,
+        max_tokens=256
+    ))
+
+    # Parse and return the JSON response
+    try:
+        return json.loads(r.choices[0].message.content)
+    except json.JSONDecodeError:
+        raise ValueError("Failed to parse JSON response from OpenAI API") from None
+
+def describe_image(path: str) -> dict:
+    """Generate a description of an image, falling back to "unknown" on errors"""
+    try:
+        return caption_image(path)
     except Exception as e:
         logger.error(f"Error processing image {path}: {str(e)}")
         return _get_fallback_description()
@@ -0,0 +1,63 @@
+import logging
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.db.session import dialect_insert
+from app.models.caption import ImageCaption
+from app.models.target import Target
+from app.services.ai import caption_image, caption_version, _get_fallback_description
+from app.services.image_store import file_hash
+
+logger = logging.getLogger(__name__)
+
+def get_caption(db: Session, tgt: Target, fallback: bool = True) -> dict:
+    """Return the target's caption, calling the vision API at most once per image
+
+    Captions are memoized in ``image_captions`` by image content hash and
+    caption version (vision model + prompt), so rescoring, or another
+    target with the same picture, never pays for a second GPT-4o call.
+    The target's ``caption`` and ``caption_status`` are updated to match.
+    On API failure the status becomes "failed" and the "unknown" fallback
+    is returned without being cached, so the next attempt retries. With
+    ``fallback=False`` the error is raised instead, for callers (scoring)
+    that must not go on with a placeholder caption.
+    The caller owns the transaction.
+    """
+    version = caption_version()
+    try:
+        digest = tgt.image_hash or file_hash(tgt.image_url)
+    except OSError as e:
+        logger.error(f"Cannot read target image {tgt.image_url}: {e}")
+        _set_caption(db, tgt, None, "failed")
+        if not fallback:
+            raise
+        return _get_fallback_description()
+
+    caption = db.execute(
+        select(ImageCaption.caption)
+        .where(ImageCaption.image_hash == digest, ImageCaption.caption_version == version)
+    ).scalar_one_or_none()
+
+    if caption is None:
+        try:
+            caption = caption_image(tgt.image_url)
+        except Exception as e:
+            logger.error(f"Captioning target {tgt.target_id} failed: {e}")
+            _set_caption(db, tgt, digest, "failed")
+            if not fallback:
+                raise
+            return _get_fallback_description()
+        db.execute(dialect_insert(db, ImageCaption)
+                   .values(image_hash=digest, caption_version=version, caption=caption)
+                   .on_conflict_do_nothing())
+
+    if tgt.caption_status != "ready" or tgt.caption != caption or tgt.image_hash != digest:
+        _set_caption(db, tgt, digest, "ready", caption)
+    return caption
+
+def _set_caption(db: Session, tgt: Target, digest: str | None, status: str, caption: dict = None):
+    values = {"caption_status": status}
+    if digest:
+        values["image_hash"] = digest
+    if caption is not None:
+        values["caption"] = caption
+    db.execute(update(Target).where(Target.target_id==tgt.target_id).values(**values))
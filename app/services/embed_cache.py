@@ -0,0 +1,123 @@
+import os, time, sqlite3, hashlib, threading, unicodedata, logging
+from pathlib import Path
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ───────────────────────────────────────────────────────
+# Set RV_EMBED_CACHE=off to disable the cache entirely
+CACHE_PATH  = os.getenv("RV_EMBED_CACHE", "app/data/cache/embeddings.sqlite3")
+MAX_ENTRIES = int(os.getenv("RV_EMBED_CACHE_MAX_ENTRIES", "20000"))
+
+def normalize(text: str) -> str:
+    """Canonical form of a text for cache lookups (NFC, collapsed whitespace)"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+def cache_key(model: str, text: str) -> str:
+    """Content address of an embedding: hash of model + normalized text"""
+    return hashlib.sha256(f"{model}\0{normalize(text)}".encode()).hexdigest()
+
+class EmbeddingCache:
+    """Persistent, size-bounded LRU cache of embedding vectors
+
+    Backed by a SQLite file in WAL mode, so it survives restarts and can be
+    shared by several uvicorn worker processes. Vectors are stored as
+    packed float32. Once more than ``max_entries`` vectors are stored the
+    least recently used ones are evicted.
+    """
+
+    def __init__(self, path: str, max_entries: int = MAX_ENTRIES):
+        self.path = Path(path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                " key TEXT PRIMARY KEY, model TEXT NOT NULL, vec BLOB NOT NULL,"
+                " last_used REAL NOT NULL)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used"
+                      " ON embeddings(last_used)")
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles cross-process locking"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get_many(self, model: str, texts: list[str]) -> dict[int, list[float]]:
+        """Look up cached vectors; returns {index in texts: vector} for hits
+
+        Hits and misses are counted once per distinct key, not per repeat.
+        """
+        keys = [cache_key(model, t) for t in texts]
+        unique = list(dict.fromkeys(keys))
+        conn = self._conn()
+        found = {}
+        # Stay well below SQLite's bound-parameter limit
+        for i in range(0, len(unique), 500):
+            chunk = unique[i:i + 500]
+            marks = ",".join("?" * len(chunk))
+            found.update(conn.execute(
+                f"SELECT key, vec FROM embeddings WHERE key IN ({marks})", chunk))
+        if found:
+            with conn:
+                conn.executemany("UPDATE embeddings SET last_used=? WHERE key=?",
+                                 [(time.time(), k) for k in found])
+
+        hits = {i: np.frombuffer(found[k], dtype=np.float32).tolist()
+                for i, k in enumerate(keys) if k in found}
+        with self._lock:
+            self.hits += len(found)
+            self.misses += len(unique) - len(found)
+        return hits
+
+    def put_many(self, model: str, texts: list[str], vectors: list[list[float]]):
+        """Store vectors and evict the least recently used overflow"""
+        now = time.time()
+        rows = [(cache_key(model, t), model, np.asarray(v, dtype=np.float32).tobytes(), now)
+                for t, v in zip(texts, vectors)]
+        conn = self._conn()
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO embeddings(key, model, vec, last_used)"
+                             " VALUES (?, ?, ?, ?)", rows)
+            conn.execute(
+                "DELETE FROM embeddings WHERE key IN ("
+                " SELECT key FROM embeddings ORDER BY last_used"
+                " LIMIT max(0, (SELECT COUNT(*) FROM embeddings) - ?))",
+                (self.max_entries,))
+
+    def stats(self) -> dict:
+        """Hit/miss counters for this process plus the current entry count"""
+        entries = self._conn().execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": entries,
+            "max_entries": self.max_entries,
+        }
+
+    def clear(self):
+        """Drop every cached vector"""
+        with self._conn() as c:
+            c.execute("DELETE FROM embeddings")
+
+_cache = None
+
+def get_cache() -> EmbeddingCache | None:
+    """Process-wide cache instance, or None when caching is disabled"""
+    global _cache
+    if CACHE_PATH.lower() in ("", "off", "none", "0"):
+        return None
+    if _cache is None:
+        _cache = EmbeddingCache(CACHE_PATH, MAX_ENTRIES)
+    return _cache
@@ -0,0 +1,105 @@
+"""
+Embedding backends
+--------------------------------------------------
+• `openai` – text-embedding-3-small over the network (default)
+• `local`  – deterministic hashed n-gram vectors, CPU only, no network
+
+Pick one with RV_EMBED_BACKEND. Every backend has a `model` name (used to
+key caches and stored vectors, so switching backends never mixes vectors)
+and an `embed_batch(texts)` method returning one vector per text.
+"""
+import os, re, math, zlib
+from collections import Counter
+from typing import Protocol
+import numpy as np
+from app.services import openai_client
+
+BACKEND   = os.getenv("RV_EMBED_BACKEND", "openai")
+LOCAL_DIM = int(os.getenv("RV_EMBED_DIM", "1024"))
+
+class EmbeddingBackend(Protocol):
+    model: str
+    # Whether vectors are worth persisting in the embedding cache
+    cacheable: bool
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]: ...
+
+class OpenAIEmbedder:
+    """OpenAI embeddings API, one request per batch on the shared client"""
+    cacheable = True
+
+    def __init__(self, model: str = "text-embedding-3-small"):
+        self.model = model
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        r = openai_client.run("embeddings", lambda c: c.embeddings.create(
+            model=self.model,
+            input=list(texts),
+            encoding_format="float"
+        ))
+        # The API tags every item with the index of its input; don't rely on order
+        return [d.embedding for d in sorted(r.data, key=lambda d: d.index)]
+
+# Function words carry no signal about the target and would dominate overlap
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its of on or "
+    "so that the there this to was were with".split())
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+class HashingEmbedder:
+    """Offline embedder using the hashing trick over word and character n-grams
+
+    Features are words, word bigrams and character trigrams (which make
+    "mountain" and "mountains" similar). Each feature gets a sublinear
+    term-frequency weight and is hashed with CRC32 into a signed bucket of
+    a fixed-size vector, which is then L2-normalized. The result is fully
+    deterministic across processes and machines.
+    """
+    cacheable = False
+
+    def __init__(self, dim: int = LOCAL_DIM):
+        self.dim = dim
+        self.model = f"local-hashing-v1-{dim}"
+
+    @staticmethod
+    def features(text: str) -> Counter:
+        words = [w for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+        feats = Counter(f"w:{w}" for w in words)
+        feats.update(f"b:{a}_{b}" for a, b in zip(words, words[1:]))
+        for w in words:
+            padded = f"<{w}>"
+            feats.update(f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2))
+        return feats
+
+    def embed_one(self, text: str) -> np.ndarray:
+        feats = self.features(text)
+        vec = np.zeros(self.dim, dtype=np.float32)
+        if not feats:
+            return vec
+        hashes = np.fromiter((zlib.crc32(f.encode()) for f in feats), dtype=np.uint64, count=len(feats))
+        weights = np.fromiter(
+            ((1 + math.log(n)) * (0.5 if f[0] == "c" else 1.0) for f, n in feats.items()),
+            dtype=np.float32, count=len(feats))
+        # Top hash bit picks the sign so collisions cancel out on average
+        signs = np.where(hashes >> 31 & 1, -1.0, 1.0).astype(np.float32)
+        np.add.at(vec, (hashes % self.dim).astype(np.intp), signs * weights)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm else vec
+
+    def embed_batch(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_one(t).tolist() for t in texts]
+
+BACKENDS = {"openai": OpenAIEmbedder, "local": HashingEmbedder}
+
+_backend = None
+
+def get_backend() -> EmbeddingBackend:
+    """Process-wide embedding backend selected by RV_EMBED_BACKEND"""
+    global _backend
+    if _backend is None:
+        try:
+            _backend = BACKENDS[BACKEND]()
+        except KeyError:
+            raise ValueError(f"Unknown RV_EMBED_BACKEND {BACKEND!r}; "
+                             f"choose one of {', '.join(BACKENDS)}") from None
+    return _backend
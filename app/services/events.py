@@ -0,0 +1,111 @@
+"""
+Session status notifications
+--------------------------------------------------
+Scoring workers run in other processes, so a finished score is announced
+through Postgres: `notify()` queues a NOTIFY on the `session_status`
+channel that is delivered when the worker's transaction commits.
+
+Each API process keeps one LISTEN connection (started from the app
+lifespan) and wakes the requests waiting on that session via
+`subscribe()` / `wait()`. If the listener is down, waiters still re-check
+the database every RV_EVENTS_RECHECK seconds, so nothing hangs.
+"""
+import os, asyncio, logging
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Iterator
+import asyncpg
+from sqlalchemy import select, func
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from app.db.session import async_url
+
+CHANNEL = "session_status"
+# Fallback re-check interval for waiters (seconds)
+RECHECK = float(os.getenv("RV_EVENTS_RECHECK", "5"))
+RECONNECT_DELAY = 5
+
+logger = logging.getLogger(__name__)
+
+_waiters: dict[int, set[asyncio.Event]] = defaultdict(set)
+_task: asyncio.Task | None = None
+
+def notify(db: Session, sid: int, status: str):
+    """Announce a session's new status once the caller's transaction commits"""
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_notify(CHANNEL, f"{sid}:{status}")))
+
+@contextmanager
+def subscribe(sid: int) -> Iterator[asyncio.Event]:
+    """An event that is set whenever the session's status changes
+
+    Subscribe before reading the session, so a change committed in between
+    is not missed.
+    """
+    ev = asyncio.Event()
+    _waiters[sid].add(ev)
+    try:
+        yield ev
+    finally:
+        _waiters[sid].discard(ev)
+        if not _waiters[sid]:
+            del _waiters[sid]
+
+async def wait(ev: asyncio.Event, timeout: float = RECHECK):
+    """Wait for a notification, or at most ``timeout`` (capped at RECHECK)"""
+    try:
+        await asyncio.wait_for(ev.wait(), min(timeout, RECHECK))
+    except TimeoutError:
+        pass
+    ev.clear()
+
+def _wake(sid: int | None = None):
+    for key in ([sid] if sid is not None else list(_waiters)):
+        for ev in _waiters.get(key, ()):
+            ev.set()
+
+def _on_notify(conn, pid, channel, payload: str):
+    try:
+        _wake(int(payload.split(":", 1)[0]))
+    except ValueError:
+        logger.warning(f"Ignoring malformed {CHANNEL} payload: {payload!r}")
+
+async def _listen(dsn: str):
+    while True:
+        conn = None
+        try:
+            conn = await asyncpg.connect(dsn)
+            closed = asyncio.Event()
+            conn.add_termination_listener(lambda c: closed.set())
+            await conn.add_listener(CHANNEL, _on_notify)
+            # Anything announced while we were disconnected was missed
+            _wake()
+            logger.info(f"Listening for {CHANNEL} notifications")
+            await closed.wait()
+            logger.warning(f"{CHANNEL} listener connection lost, reconnecting")
+        except asyncio.CancelledError:
+            if conn is not None:
+                await conn.close()
+            raise
+        except Exception as e:
+            logger.error(f"{CHANNEL} listener failed: {e}")
+        await asyncio.sleep(RECONNECT_DELAY)
+
+def start():
+    """Start the LISTEN task on the running loop (Postgres only)"""
+    global _task
+    url = make_url(async_url)
+    if url.get_backend_name() != "postgresql" or _task is not None:
+        return
+    dsn = url.set(drivername="postgresql").render_as_string(hide_password=False)
+    _task = asyncio.get_running_loop().create_task(_listen(dsn))
+
+async def stop():
+    global _task
+    task, _task = _task, None
+    if task is not None:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
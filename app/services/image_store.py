@@ -0,0 +1,199 @@
+import os, shutil, sqlite3, hashlib, threading, logging
+from pathlib import Path
+from typing import NamedTuple
+import numpy as np
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# ── Configuration ───────────────────────────────────────────────────────
+STORE_ROOT = os.getenv("RV_IMAGE_STORE", "app/data/images")
+# Max differing bits (of 64) for two images to count as near-duplicates
+MAX_DISTANCE = int(os.getenv("RV_PHASH_MAX_DISTANCE", "6"))
+
+EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif"}
+
+def file_hash(path: str) -> str:
+    """SHA-256 of a file's bytes, read in chunks"""
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+def dhash(img: Image.Image) -> int:
+    """64-bit difference hash: survives resizing, re-encoding and small edits
+
+    The image is shrunk to 9×8 grayscale and each bit records whether a
+    pixel is brighter than its right-hand neighbour.
+    """
+    px = np.asarray(img.convert("L").resize((9, 8), Image.LANCZOS), dtype=np.int16)
+    bits = (px[:, 1:] > px[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+def hamming(a: np.ndarray, b: int) -> np.ndarray:
+    """Bit distances between every hash in ``a`` and the hash ``b``"""
+    x = np.bitwise_xor(a, np.uint64(b))
+    return np.unpackbits(x.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+class StoredImage(NamedTuple):
+    sha256: str
+    path: str
+    phash: int
+
+class DuplicateImageError(ValueError):
+    """The image (or a near-identical one) is already in the store"""
+    def __init__(self, existing: StoredImage, distance: int):
+        self.existing = existing
+        self.distance = distance
+        kind = "identical" if distance == 0 else f"{distance} bits from"
+        super().__init__(f"Image is {kind} stored image {existing.sha256[:12]}")
+
+class ImageStore:
+    """Content-addressed image files with a perceptual-hash index
+
+    Files live at ``root/ab/cd/<sha256><ext>``, two levels of 256 shards
+    each, so no directory grows large. ``root/index.sqlite3`` (WAL, shared
+    across processes) maps each SHA-256 to its path and dHash. The hashes
+    are also held in memory as a uint64 array, refreshed incrementally from
+    the index, so a near-duplicate check is one vectorized XOR/popcount.
+    """
+
+    def __init__(self, root: str = STORE_ROOT, max_distance: int = MAX_DISTANCE):
+        self.root = Path(root)
+        self.max_distance = max_distance
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._rowid = 0
+        self._shas: list[str] = []
+        self._hashes = np.empty(0, dtype=np.uint64)
+        self.root.mkdir(parents=True, exist_ok=True)
+        with self._conn() as c:
+            c.execute(
+                "CREATE TABLE IF NOT EXISTS images ("
+                " sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, phash INTEGER NOT NULL)")
+
+    def _conn(self) -> sqlite3.Connection:
+        """One connection per thread; SQLite handles cross-process locking"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.root / "index.sqlite3", timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _refresh(self):
+        """Pull hashes added since the last refresh (possibly by other processes)"""
+        rows = self._conn().execute(
+            "SELECT rowid, sha256, phash FROM images WHERE rowid > ? ORDER BY rowid",
+            (self._rowid,)).fetchall()
+        if rows:
+            self._rowid = rows[-1][0]
+            self._shas.extend(r[1] for r in rows)
+            # SQLite integers are signed; keep the bit pattern
+            new = np.array([r[2] for r in rows], dtype=np.int64).view(np.uint64)
+            self._hashes = np.concatenate([self._hashes, new])
+
+    def path_for(self, sha256: str, ext: str = ".jpg") -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / f"{sha256}{ext}"
+
+    def get(self, sha256: str) -> StoredImage | None:
+        """Look up a stored image by content hash"""
+        row = self._conn().execute(
+            "SELECT sha256, path, phash FROM images WHERE sha256=?", (sha256,)).fetchone()
+        return StoredImage(row[0], row[1], row[2] & 0xFFFFFFFFFFFFFFFF) if row else None
+
+    def nearest(self, phash: int) -> tuple[str, int] | None:
+        """The stored image closest to ``phash`` as (sha256, distance)"""
+        with self._lock:
+            self._refresh()
+            if not len(self._hashes):
+                return None
+            dist = hamming(self._hashes, phash)
+            i = int(dist.argmin())
+            return self._shas[i], int(dist[i])
+
+    def check(self, sha256: str, phash: int):
+        """Raise DuplicateImageError if the image or a near-duplicate is stored"""
+        existing = self.get(sha256)
+        if existing:
+            raise DuplicateImageError(existing, 0)
+        near = self.nearest(phash)
+        if near and near[1] <= self.max_distance:
+            raise DuplicateImageError(self.get(near[0]), near[1])
+
+    def _reserve(self, sha256: str, dest: Path, phash: int) -> StoredImage:
+        """Check for duplicates and index the image in one write transaction
+
+        BEGIN IMMEDIATE takes the index's write lock up front, so concurrent
+        puts (other threads or processes) can't both pass the check.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.check(sha256, phash)
+            conn.execute("INSERT INTO images(sha256, path, phash) VALUES (?, ?, ?)",
+                         (sha256, str(dest), int(np.uint64(phash).view(np.int64))))
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+        return StoredImage(sha256, str(dest), phash)
+
+    def _write(self, stored: StoredImage, write) -> StoredImage:
+        """Write a reserved image's file with ``write(dest)``; un-index it on failure"""
+        dest = Path(stored.path)
+        try:
+            dest.parent.mkdir(parents=True, exist_ok=True)
+            write(dest)
+        except BaseException:
+            with self._conn() as c:
+                c.execute("DELETE FROM images WHERE sha256=?", (stored.sha256,))
+            raise
+        logger.info(f"Stored image {stored.sha256[:12]} at {dest}")
+        return stored
+
+    def put(self, src: str, move: bool = False) -> StoredImage:
+        """Add an image file to the store, rejecting duplicates
+
+        Raises DuplicateImageError if the same bytes, or an image within
+        ``max_distance`` bits of dHash, are already stored. The check and
+        the index entry are one transaction, so two near-duplicates put at
+        the same time can't both get in. With ``move`` the source file is
+        renamed into the store instead of copied.
+        """
+        sha = file_hash(src)
+        with Image.open(src) as img:
+            phash = dhash(img)
+            ext = EXTENSIONS.get(img.format, Path(src).suffix.lower() or ".img")
+        stored = self._reserve(sha, self.path_for(sha, ext), phash)
+
+        def write(dest: Path):
+            if move:
+                os.replace(src, dest)
+            else:
+                tmp = dest.with_name(f".{dest.name}.part")
+                shutil.copyfile(src, tmp)
+                os.replace(tmp, dest)
+        return self._write(stored, write)
+
+    def put_bytes(self, data: bytes, ext: str, phash: int, sha256: str = None) -> StoredImage:
+        """Like put() for an image already in memory with a known dHash"""
+        sha = sha256 or hashlib.sha256(data).hexdigest()
+        stored = self._reserve(sha, self.path_for(sha, ext), phash)
+
+        def write(dest: Path):
+            tmp = dest.with_name(f".{dest.name}.part")
+            tmp.write_bytes(data)
+            os.replace(tmp, dest)
+        return self._write(stored, write)
+
+_store = None
+
+def get_store() -> ImageStore:
+    """Process-wide image store rooted at RV_IMAGE_STORE"""
+    global _store
+    if _store is None:
+        _store = ImageStore(STORE_ROOT, MAX_DISTANCE)
+    return _store
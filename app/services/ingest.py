@@ -0,0 +1,203 @@
+"""
+Bulk target ingest
+--------------------------------------------------
+Loads a curated image corpus (a directory or a tarball) into the target
+pool. Decoding, normalizing, hashing and dHashing run in a process pool;
+the parent files the results in the image store, which rejects
+near-duplicates, and inserts targets with one multi-row INSERT per batch.
+
+Every committed batch is appended to a checkpoint file, so an interrupted
+run picks up where it stopped. The images themselves are idempotent: an
+image already in the store whose target never got committed is simply
+given its target on the next run.
+"""
+import os, io, json, uuid, hashlib, tarfile, logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait as wait_futures
+from typing import Callable, Iterator
+from PIL import Image, ImageOps
+from sqlalchemy import select
+from app.db.session import get_db, dialect_insert
+from app.models.target import Target
+from app.services import pipeline
+from app.services.image_store import get_store, dhash, EXTENSIONS, DuplicateImageError
+from app.services.targets import IMAGE_SUFFIXES
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = Path("app/data/ingest")
+# Formats stored as-is when they already fit; everything else becomes JPEG
+KEEP_FORMATS = {"JPEG", "PNG"}
+
+def list_sources(path: str) -> list[str]:
+    """Keys of every image in a directory (relative paths) or tarball (member names)"""
+    p = Path(path)
+    if p.is_dir():
+        return sorted(str(f.relative_to(p)) for f in p.rglob("*")
+                      if f.is_file() and f.suffix.lower() in IMAGE_SUFFIXES)
+    with tarfile.open(p, "r:*") as tar:
+        return [m.name for m in tar if m.isfile() and Path(m.name).suffix.lower() in IMAGE_SUFFIXES]
+
+def iter_sources(path: str, keys: set[str]) -> Iterator[tuple[str, str | bytes]]:
+    """Yield ``(key, file path or bytes)`` for the wanted keys
+
+    Tar members are read here, in archive order, since a tarball can't be
+    shared between worker processes.
+    """
+    p = Path(path)
+    if p.is_dir():
+        for key in sorted(keys):
+            yield key, str(p / key)
+        return
+    with tarfile.open(p, "r:*") as tar:
+        for m in tar:
+            if m.name in keys:
+                yield m.name, tar.extractfile(m).read()
+
+def normalize_image(key: str, src: str | bytes, max_edge: int) -> dict:
+    """Decode, validate and normalize one image (runs in a worker process)
+
+    Applies EXIF rotation and shrinks the longest edge to ``max_edge``.
+    Images that already fit and are JPEG/PNG keep their original bytes.
+    Returns the stored bytes with their SHA-256 and dHash, or an error.
+    """
+    try:
+        raw = src if isinstance(src, bytes) else Path(src).read_bytes()
+        with Image.open(io.BytesIO(raw)) as img:
+            img.load()  # full decode: catches truncated files
+            fmt = img.format
+            rotated = img.getexif().get(0x0112, 1) != 1  # EXIF Orientation
+            out = ImageOps.exif_transpose(img) if rotated else img
+            if max(out.size) > max_edge or fmt not in KEEP_FORMATS or rotated:
+                out.thumbnail((max_edge, max_edge), Image.LANCZOS)
+                buf = io.BytesIO()
+                out.convert("RGB").save(buf, "JPEG", quality=90, optimize=True)
+                raw, fmt = buf.getvalue(), "JPEG"
+            phash = dhash(out)
+        return {"key": key, "data": raw, "ext": EXTENSIONS[fmt],
+                "sha256": hashlib.sha256(raw).hexdigest(), "phash": phash}
+    except Exception as e:
+        return {"key": key, "error": f"{type(e).__name__}: {e}"}
+
+class Checkpoint:
+    """Append-only record of the source keys already ingested"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.done: set[str] = set()
+        if self.path.exists():
+            with open(self.path) as f:
+                self.done = {json.loads(line) for line in f if line.strip()}
+
+    def add(self, keys: list[str]):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.writelines(json.dumps(k) + "\n" for k in keys)
+            f.flush()
+            os.fsync(f.fileno())
+        self.done.update(keys)
+
+def default_checkpoint(path: str) -> Path:
+    """Checkpoint location for a source, stable across runs"""
+    digest = hashlib.sha1(str(Path(path).resolve()).encode()).hexdigest()[:12]
+    return CHECKPOINT_DIR / f"{Path(path).name}-{digest}.jsonl"
+
+def _bounded(executor, fn, items, window: int, *args):
+    """Like executor.map, but with at most ``window`` items in flight"""
+    pending = set()
+    for item in items:
+        pending.add(executor.submit(fn, *item, *args))
+        if len(pending) >= window:
+            done, pending = wait_futures(pending, return_when=FIRST_COMPLETED)
+            yield from (f.result() for f in done)
+    for f in pending:
+        yield f.result()
+
+def _new_target_id() -> str:
+    return str(uuid.uuid4().int % 10**8).zfill(8)
+
+def _insert_targets(rows: list[dict]) -> list[str]:
+    """Multi-row insert of new pool targets; returns their ids
+
+    Ids are random 8-digit numbers like picsum seeds, so the rare clash
+    is skipped by ON CONFLICT and retried with a fresh id.
+    """
+    ids = []
+    with get_db() as db:
+        # Images already in the store from an interrupted run may have a target
+        hashes = [r["image_hash"] for r in rows]
+        have = set(db.execute(select(Target.image_hash)
+                              .where(Target.image_hash.in_(hashes))).scalars())
+        rows = [r for r in {r["image_hash"]: r for r in rows}.values()
+                if r["image_hash"] not in have]
+        while rows:
+            for r in rows:
+                r["target_id"] = _new_target_id()
+            inserted = set(db.execute(
+                dialect_insert(db, Target).values(rows)
+                .on_conflict_do_nothing(index_elements=["target_id"])
+                .returning(Target.target_id)).scalars())
+            ids.extend(inserted)
+            rows = [r for r in rows if r["target_id"] not in inserted]
+    return ids
+
+def ingest(path: str, workers: int = None, batch_size: int = 200, max_edge: int = 1024,
+           caption: bool = False, checkpoint: str = None,
+           on_progress: Callable[[dict], None] = None) -> dict:
+    """Ingest every image under ``path`` into the target pool
+
+    ``on_progress`` is called with the running counters after each image.
+    With ``caption`` the new targets are also captioned and embedded via
+    the pre-caption pipeline before returning.
+    """
+    ckpt = Checkpoint(checkpoint or default_checkpoint(path))
+    keys = set(list_sources(path))
+    todo = keys - ckpt.done
+    stats = {"total": len(keys), "skipped": len(keys) - len(todo),
+             "added": 0, "duplicates": 0, "failed": 0}
+    if on_progress:
+        on_progress(stats)
+    store, batch, batch_keys, jobs = get_store(), [], [], []
+
+    def flush():
+        ids = _insert_targets(batch) if batch else []
+        ckpt.add(batch_keys)
+        stats["added"] += len(ids)
+        # Exact duplicates that already had a target
+        stats["duplicates"] += len(batch) - len(ids)
+        if caption:
+            jobs.extend(f for f in map(pipeline.submit, ids) if f is not None)
+        batch.clear()
+        batch_keys.clear()
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as ex:
+        sources = iter_sources(path, todo)
+        for res in _bounded(ex, normalize_image, sources, 4 * workers, max_edge):
+            batch_keys.append(res["key"])
+            if "error" in res:
+                logger.warning(f"Skipping {res['key']}: {res['error']}")
+                stats["failed"] += 1
+            else:
+                try:
+                    stored = store.put_bytes(res["data"], res["ext"], res["phash"], res["sha256"])
+                    batch.append({"image_url": stored.path, "image_hash": stored.sha256,
+                                  "caption": {}, "caption_status": "pending"})
+                except DuplicateImageError as e:
+                    if e.distance == 0:
+                        # Stored by an interrupted run; make sure it has a target
+                        batch.append({"image_url": e.existing.path, "image_hash": e.existing.sha256,
+                                      "caption": {}, "caption_status": "pending"})
+                    else:
+                        stats["duplicates"] += 1
+            if len(batch_keys) >= batch_size:
+                flush()
+            if on_progress:
+                on_progress(stats)
+        flush()
+    if on_progress:
+        on_progress(stats)
+
+    # Failures are logged by the pipeline and retried at finish
+    wait_futures(jobs)
+    return stats
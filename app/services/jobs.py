@@ -0,0 +1,165 @@
+"""
+Durable scoring jobs
+--------------------------------------------------
+`POST /sessions/{sid}/finish` enqueues a row in `scoring_jobs` instead of
+scoring in the API process; `python -m app.worker` processes the queue.
+
+• Enqueueing is idempotent: each job has a unique idempotency key (the
+  client's `Idempotency-Key`, else one per session), so a repeated finish
+  returns the existing job instead of scoring the session twice.
+• Workers claim jobs with `FOR UPDATE SKIP LOCKED`, like the target pool,
+  and hold them on a lease (RV_SCORING_LEASE seconds). A worker that dies
+  mid-job simply lets the lease run out and another worker picks it up.
+  Due times and leases use the database server's clock, so workers on
+  hosts with other time zones or skewed clocks agree on them.
+• A failed job is retried with jittered exponential backoff, up to
+  RV_SCORING_MAX_ATTEMPTS runs; after that it is dead-lettered (status
+  "dead", error kept in `last_error`) and the session is marked failed.
+  Finishing the session again requeues a dead job.
+"""
+import os, random, logging, traceback
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from app.db.session import get_db, dialect_insert
+from app.models.job import ScoringJob
+from app.models.session import Session as SessionModel
+from app.services import events
+from app.services.sessions import score_session
+
+MAX_ATTEMPTS = int(os.getenv("RV_SCORING_MAX_ATTEMPTS", "5"))
+LEASE        = float(os.getenv("RV_SCORING_LEASE", "300"))
+BACKOFF_BASE = float(os.getenv("RV_SCORING_BACKOFF_BASE", "5"))
+BACKOFF_CAP  = float(os.getenv("RV_SCORING_BACKOFF_CAP", "300"))
+
+logger = logging.getLogger(__name__)
+
+class LeaseLost(RuntimeError):
+    """The job was reclaimed by another worker after our lease ran out"""
+
+def _now(db, seconds: float = 0):
+    """The database's current time plus ``seconds``, as a SQL expression
+
+    SQLite (tests, one host) has no usable server clock for TIMESTAMP
+    columns, so it gets the local time instead.
+    """
+    if db.get_bind().dialect.name == "sqlite":
+        return datetime.now() + timedelta(seconds=seconds)
+    return func.now() + timedelta(seconds=seconds) if seconds else func.now()
+
+def default_key(sid: int) -> str:
+    return f"session:{sid}"
+
+def enqueue_stmt(db, sid: int, key: str):
+    """INSERT … RETURNING for a new job; re-queues the key's job only if it is dead
+
+    Returns no row when the key already has a live or finished job. ``db``
+    (sync or async) only picks the dialect.
+    """
+    now = _now(db)
+    stmt = dialect_insert(db, ScoringJob).values(session_id=sid, idempotency_key=key, run_at=now)
+    return (stmt.on_conflict_do_update(
+                index_elements=["idempotency_key"],
+                set_={"status": "queued", "attempts": 0, "run_at": now,
+                      "locked_by": None, "finished_at": None},
+                where=ScoringJob.status == "dead")
+            .returning(ScoringJob.job_id, ScoringJob.session_id, ScoringJob.status))
+
+def job_by_key_stmt(key: str):
+    return select(ScoringJob.job_id, ScoringJob.session_id, ScoringJob.status).where(
+        ScoringJob.idempotency_key == key)
+
+def enqueue(db: Session, sid: int, key: str = None):
+    """Queue scoring for a session; returns ``(job_id, session_id, status)``"""
+    key = key or default_key(sid)
+    row = db.execute(enqueue_stmt(db, sid, key)).one_or_none()
+    return row or db.execute(job_by_key_stmt(key)).one()
+
+def backoff(attempts: int) -> float:
+    """Seconds before retrying a job that has failed ``attempts`` times"""
+    delay = min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempts - 1))
+    return random.uniform(delay / 2, delay)
+
+def claim(db: Session, worker: str):
+    """Take the next due job (or one whose lease expired) for ``worker``
+
+    Returns ``(job_id, session_id, attempts)`` or None. The caller owns the
+    transaction and should commit right away to publish the lease.
+    """
+    pick = (select(ScoringJob.job_id)
+            .where(ScoringJob.status.in_(("queued", "running")), ScoringJob.run_at <= _now(db))
+            .order_by(ScoringJob.run_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery())
+    return db.execute(
+        update(ScoringJob)
+        .where(ScoringJob.job_id == pick)
+        .values(status="running", run_at=_now(db, LEASE), locked_by=worker,
+                attempts=ScoringJob.attempts + 1)
+        .returning(ScoringJob.job_id, ScoringJob.session_id, ScoringJob.attempts)
+    ).one_or_none()
+
+def _release(db: Session, job_id: int, worker: str, **values) -> bool:
+    """Update a job we hold; False if our lease was lost"""
+    return db.execute(
+        update(ScoringJob)
+        .where(ScoringJob.job_id == job_id, ScoringJob.status == "running",
+               ScoringJob.locked_by == worker)
+        .values(locked_by=None, **values)
+    ).rowcount == 1
+
+def complete(db: Session, job: tuple, worker: str):
+    """Mark a job done in the scoring transaction; raises LeaseLost if it was reclaimed"""
+    job_id, sid, _ = job
+    if not _release(db, job_id, worker, status="done", finished_at=_now(db)):
+        raise LeaseLost(f"Scoring job {job_id} was reclaimed by another worker")
+    events.notify(db, sid, "scored")
+
+def fail(db: Session, job: tuple, worker: str, error: str) -> str:
+    """Schedule a retry, or dead-letter the job once it is out of attempts
+
+    Returns the job's new status ("queued" or "dead"), or "lost" if the
+    lease was reclaimed and the job was left to its new owner.
+    """
+    job_id, sid, attempts = job
+    if attempts < MAX_ATTEMPTS:
+        delay = backoff(attempts)
+        if not _release(db, job_id, worker, status="queued", last_error=error,
+                        run_at=_now(db, delay)):
+            return "lost"
+        logger.warning(f"Scoring job {job_id} (session {sid}) failed, "
+                       f"attempt {attempts}/{MAX_ATTEMPTS}; retrying in {delay:.0f}s")
+        return "queued"
+    if not _release(db, job_id, worker, status="dead", last_error=error, finished_at=_now(db)):
+        return "lost"
+    db.execute(update(SessionModel).where(SessionModel.session_id == sid)
+               .values(status="failed"))
+    events.notify(db, sid, "failed")
+    logger.error(f"Scoring job {job_id} (session {sid}) dead after {attempts} attempts: {error}")
+    return "dead"
+
+def run_once(worker: str) -> bool:
+    """Claim and run one job; False if none was due"""
+    with get_db() as db:
+        job = claim(db, worker)
+    if job is None:
+        return False
+    job_id, sid, attempts = job
+    if attempts > MAX_ATTEMPTS:
+        # Its leases kept running out, e.g. it crashes the worker
+        with get_db() as db:
+            fail(db, job, worker, "Lease expired on every attempt")
+        return True
+    try:
+        with get_db() as db:
+            score_session(db, sid)
+            complete(db, job, worker)
+        logger.info(f"Scoring job {job_id} (session {sid}) done")
+    except LeaseLost as e:
+        logger.warning(str(e))
+    except Exception as e:
+        error = "".join(traceback.format_exception_only(e)).strip()
+        with get_db() as db:
+            fail(db, job, worker, error)
+    return True
@@ -0,0 +1,86 @@
+import os
+import numpy as np
+from sqlalchemy import select, update, func, type_coerce, LargeBinary
+from sqlalchemy.orm import Session
+from app.models.session import Session as SessionModel
+from app.models.target import Target
+from app.models.types import unpack_many
+from app.services.ai import embed, embedding_model
+from app.services.notes import session_notes
+from app.services.score import VECTOR_KEYS, target_vectors
+
+# How many decoy targets to judge against when the caller doesn't say
+DEFAULT_DECOYS = int(os.getenv("RV_JUDGE_DECOYS", "100"))
+# Upper bound a caller may ask for
+MAX_DECOYS = int(os.getenv("RV_JUDGE_MAX_DECOYS", "20000"))
+
+def normalize_rows(mat) -> np.ndarray:
+    """Scale every row of a matrix to unit length (zero rows stay zero)"""
+    mat = np.asarray(mat, dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=-1, keepdims=True)
+    return mat / np.where(norms == 0, 1, norms)
+
+def rank_against_decoys(notes_vec, target_vec, decoy_mat) -> dict:
+    """Rank the real target among decoys by similarity to the notes
+
+    The target and decoys are stacked into one matrix, normalized, and
+    compared with the notes in a single matrix-vector product. Rank 1 means
+    the notes matched the real target better than every decoy; ``p_value``
+    is the chance of doing at least that well by luck.
+    """
+    mat = normalize_rows(np.vstack([np.asarray(target_vec)[None, :], decoy_mat]))
+    sims = mat @ normalize_rows(notes_vec)
+    true_sim, decoy_sims = sims[0], sims[1:]
+    n = len(decoy_sims)
+    above = int(np.count_nonzero(decoy_sims > true_sim))
+    ties = int(np.count_nonzero(decoy_sims == true_sim))
+    return {
+        "rank": above + 1,
+        "candidates": n + 1,
+        "percentile": round(100 * (n - above - ties / 2) / n, 2) if n else 100.0,
+        "p_value": (above + 1) / (n + 1),
+        "similarity": float(true_sim),
+        "best_decoy_similarity": float(decoy_sims.max()) if n else None,
+    }
+
+def judge_session(db: Session, sid: int, decoys: int = DEFAULT_DECOYS) -> dict | None:
+    """Judge a session's notes against its target and random decoys
+
+    Decoys are other captioned targets that already have stored vectors
+    from the active embedding model; their full-description rows are
+    compared. A target embedded with another backend is re-embedded from
+    its caption.
+    Returns None if the session doesn't exist and raises ValueError if its
+    target has not been captioned yet.
+    """
+    ses = db.execute(select(SessionModel).where(SessionModel.session_id==sid)).scalar_one_or_none()
+    if not ses:
+        return None
+    tgt = db.execute(select(Target).where(Target.target_id==ses.target_id)).scalar_one()
+    if tgt.caption_status != "ready":
+        raise ValueError("Target has not been captioned yet; finish the session first")
+    model = embedding_model()
+    if tgt.embeddings is None or tgt.embedding_model != model:
+        vecs, _ = target_vectors(tgt.caption)
+        db.execute(update(Target).where(Target.target_id==tgt.target_id)
+                   .values(embeddings=vecs["vectors"], embedding_model=model,
+                           caption_hash=vecs["caption_hash"]))
+        tgt.embeddings = vecs["vectors"]
+
+    # Fetch raw bytes so all decoys are unpacked in one bulk view
+    blobs = db.execute(
+        select(type_coerce(Target.embeddings, LargeBinary))
+        .where(Target.target_id != tgt.target_id,
+               Target.caption_status == "ready",
+               Target.embeddings.is_not(None),
+               Target.embedding_model == model)
+        .order_by(func.random()).limit(decoys)
+    ).scalars().all()
+    full = VECTOR_KEYS.index("full")
+    if blobs:
+        decoy_mat = unpack_many(blobs)[:, full, :]
+    else:
+        decoy_mat = np.empty((0, tgt.embeddings.shape[1]), dtype=np.float32)
+
+    result = rank_against_decoys(embed(session_notes(db, sid)), tgt.embeddings[full], decoy_mat)
+    return {"session_id": sid, "target_id": tgt.target_id, **result}
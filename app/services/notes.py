@@ -0,0 +1,58 @@
+"""
+Session notes
+--------------------------------------------------
+Notes are appended to `session_notes`, so adding notes is a small INSERT
+(one row, or one multi-row batch) instead of rewriting the session's text.
+Scoring reads them back with one query over the (session_id, seq) index
+and joins them into the same "[Stage N] text" transcript that used to be
+stored on `sessions.user_notes`, so cached note embeddings stay valid.
+"""
+from collections import defaultdict
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session
+from app.db.session import dialect_insert
+from app.models.note import SessionNote
+
+def add_note_stmt(sid: int, stage: int, text: str):
+    return insert(SessionNote).values(session_id=sid, stage=stage, text=text)
+
+def add_notes_stmt(db, sid: int, notes: list[dict]):
+    """Multi-row INSERT of ``{stage, text, client_id}`` notes, in order
+
+    Notes whose client_id the session already has are skipped, so a batch
+    resent after a lost response is harmless. Returns the new rows' seq.
+    """
+    rows = [{"session_id": sid, "stage": n["stage"], "text": n["text"],
+             "client_id": n.get("client_id")} for n in notes]
+    return (dialect_insert(db, SessionNote).values(rows)
+            .on_conflict_do_nothing(index_elements=["session_id", "client_id"])
+            .returning(SessionNote.seq))
+
+def notes_stmt(sids: list[int] = None):
+    """Notes in order, for some sessions or (``sids=None``) all of them"""
+    q = select(SessionNote.session_id, SessionNote.stage, SessionNote.text)
+    if sids is not None:
+        q = q.where(SessionNote.session_id.in_(sids))
+    return q.order_by(SessionNote.session_id, SessionNote.seq)
+
+def format_notes(rows) -> str:
+    """Join ``(stage, text)`` pairs into the session transcript
+
+    Stage 0 holds migrated text that preceded any stage marker.
+    """
+    return "".join(text if stage == 0 else f"\n[Stage {stage}] {text}" for stage, text in rows)
+
+def group_notes(rows) -> dict[int, str]:
+    """Transcripts by session id from ``notes_stmt`` rows"""
+    grouped = defaultdict(list)
+    for sid, stage, text in rows:
+        grouped[sid].append((stage, text))
+    return {sid: format_notes(notes) for sid, notes in grouped.items()}
+
+def session_notes(db: Session, sid: int) -> str:
+    """The session's notes as one transcript ("" if it has none)"""
+    return format_notes((r.stage, r.text) for r in db.execute(notes_stmt([sid])))
+
+def notes_by_session(db: Session, sids: list[int] = None) -> dict[int, str]:
+    """Transcripts for many sessions in one query; sessions without notes are absent"""
+    return group_notes(db.execute(notes_stmt(sids)))
@@ -0,0 +1,118 @@
+"""
+Shared OpenAI client
+--------------------------------------------------
+One lazily built, process-wide `AsyncOpenAI` client used for embeddings,
+vision, TTS and STT. It runs on a dedicated event-loop thread so sync code
+(scoring jobs, the pre-caption pool) and async code (the voice CLI) share
+the same keep-alive connection pool.
+
+• `run(endpoint, fn)`         – call from sync code, blocks for the result
+• `await acall(endpoint, fn)` – call from any other event loop
+
+`fn` receives the client and returns the API coroutine, e.g.
+`run("embeddings", lambda c: c.embeddings.create(...))`. Each endpoint has
+its own concurrency limit (RV_OPENAI_CONCURRENCY, or per endpoint as
+RV_OPENAI_CONCURRENCY_EMBEDDINGS etc.), and 429/5xx/connection errors are
+retried with jittered exponential backoff.
+"""
+import os, random, asyncio, logging, threading
+from typing import Awaitable, Callable, TypeVar
+import httpx
+import openai
+
+CONCURRENCY     = int(os.getenv("RV_OPENAI_CONCURRENCY", "8"))
+MAX_CONNECTIONS = int(os.getenv("RV_OPENAI_MAX_CONNECTIONS", "32"))
+MAX_RETRIES     = int(os.getenv("RV_OPENAI_MAX_RETRIES", "5"))
+TIMEOUT         = float(os.getenv("RV_OPENAI_TIMEOUT", "60"))
+# Backoff doubles from BACKOFF_BASE up to BACKOFF_CAP seconds ("full jitter")
+BACKOFF_BASE    = float(os.getenv("RV_OPENAI_BACKOFF_BASE", "0.5"))
+BACKOFF_CAP     = float(os.getenv("RV_OPENAI_BACKOFF_CAP", "20"))
+
+RETRYABLE = (openai.RateLimitError, openai.InternalServerError,
+             openai.APIConnectionError)  # APITimeoutError is a connection error
+
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_loop: asyncio.AbstractEventLoop | None = None
+_client: openai.AsyncOpenAI | None = None
+_semaphores: dict[str, asyncio.Semaphore] = {}
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _lock:
+        if _loop is None or _loop.is_closed():
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="openai-client", daemon=True).start()
+        return _loop
+
+def get_client() -> openai.AsyncOpenAI:
+    """The shared client (built on first use from OPENAI_* environment variables)"""
+    global _client
+    if _client is None:
+        http = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS,
+                                max_keepalive_connections=MAX_CONNECTIONS),
+            timeout=TIMEOUT)
+        # Retries are ours (with jitter and per-endpoint limits), not the SDK's
+        _client = openai.AsyncOpenAI(http_client=http, max_retries=0)
+    return _client
+
+def _semaphore(endpoint: str) -> asyncio.Semaphore:
+    # Only touched from the client loop thread, so no locking needed
+    sem = _semaphores.get(endpoint)
+    if sem is None:
+        limit = int(os.getenv(f"RV_OPENAI_CONCURRENCY_{endpoint.upper()}", CONCURRENCY))
+        sem = _semaphores[endpoint] = asyncio.Semaphore(limit)
+    return sem
+
+def backoff_delay(attempt: int, error: Exception | None = None) -> float:
+    """Seconds to sleep before retry ``attempt`` (0-based)
+
+    Honors a Retry-After header when the API sends one, otherwise uses
+    full jitter so concurrent jobs don't retry in lockstep.
+    """
+    response = getattr(error, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), BACKOFF_CAP)
+        except ValueError:
+            pass
+    return random.uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt))
+
+async def _call(endpoint: str, fn: Callable[[openai.AsyncOpenAI], Awaitable[T]]) -> T:
+    async with _semaphore(endpoint):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                return await fn(get_client())
+            except RETRYABLE as e:
+                if attempt == MAX_RETRIES:
+                    raise
+                delay = backoff_delay(attempt, e)
+                logger.warning(f"OpenAI {endpoint} failed ({type(e).__name__}), "
+                               f"retry {attempt + 1}/{MAX_RETRIES} in {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+def run(endpoint: str, fn: Callable[[openai.AsyncOpenAI], Awaitable[T]]) -> T:
+    """Run an API call on the shared client and wait for its result"""
+    loop = _get_loop()
+    if threading.current_thread().name == "openai-client":
+        raise RuntimeError("run() would deadlock on the client loop; use acall()")
+    return asyncio.run_coroutine_threadsafe(_call(endpoint, fn), loop).result()
+
+async def acall(endpoint: str, fn: Callable[[openai.AsyncOpenAI], Awaitable[T]]) -> T:
+    """Async version of run() for callers on their own event loop"""
+    return await asyncio.wrap_future(
+        asyncio.run_coroutine_threadsafe(_call(endpoint, fn), _get_loop()))
+
+def reset():
+    """Close the client so the next call rebuilds it (e.g. after env changes)"""
+    global _client
+    with _lock:
+        client, _client = _client, None
+        loop = _loop
+    _semaphores.clear()
+    if client is not None and loop is not None and loop.is_running():
+        asyncio.run_coroutine_threadsafe(client.close(), loop).result()
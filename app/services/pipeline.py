@@ -0,0 +1,136 @@
+"""
+Target pre-captioning pipeline
+--------------------------------------------------
+A new target is captioned and its category vectors are embedded in the
+background as soon as it is created, while the user is still viewing.
+`finish` then only has to embed the notes.
+
+Work runs on a bounded thread pool (RV_PRECAPTION_WORKERS, 0 disables the
+pipeline). Jobs are keyed by target id, so submitting a target that is
+already in flight returns the existing job. That registry is per process,
+and scoring runs in the worker processes, so both sides also take the
+target's advisory lock (`lock_target()`) around the work: a scoring job
+that arrives mid-caption waits for the lock and then finds the caption
+and vectors already stored. A job lost to a restart is simply redone at
+scoring time.
+"""
+import os, time, logging, threading
+from concurrent.futures import ThreadPoolExecutor, Future, TimeoutError
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from app.db.session import get_db
+from app.models.target import Target
+from app.services.captions import get_caption
+from app.services.score import target_vectors
+
+WORKERS = int(os.getenv("RV_PRECAPTION_WORKERS", "2"))
+# Longest scoring will wait on an in-flight job before doing the work itself
+WAIT_TIMEOUT = float(os.getenv("RV_PRECAPTION_WAIT", "60"))
+LOCK_POLL = 0.2
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_inflight: dict[str, Future] = {}
+_lock = threading.Lock()
+
+def prepare_target(db: Session, tgt: Target, fallback: bool = True) -> tuple[dict, dict | None]:
+    """Caption a target and make sure its category vectors are stored
+
+    Returns ``(caption, vectors_record)``. Both steps reuse what is
+    already stored, so calling this on a prepared target makes no API calls.
+    ``fallback`` is passed to :func:`get_caption`. If captioning failed and
+    the placeholder caption came back, no vectors are built from it and any
+    stored ones are cleared, so the record is None. The caller owns the
+    transaction.
+    """
+    desc = get_caption(db, tgt, fallback)
+    if tgt.caption_status != "ready":
+        db.execute(update(Target).where(Target.target_id==tgt.target_id)
+                   .values(embeddings=None, embedding_model=None, caption_hash=None))
+        return desc, None
+    stored = {"model": tgt.embedding_model, "caption_hash": tgt.caption_hash,
+              "vectors": tgt.embeddings}
+    vecs, fresh = target_vectors(desc, stored)
+    if fresh:
+        db.execute(update(Target).where(Target.target_id==tgt.target_id)
+                   .values(embeddings=vecs["vectors"], embedding_model=vecs["model"],
+                           caption_hash=vecs["caption_hash"]))
+    return desc, vecs
+
+def lock_target(db: Session, target_id: str, timeout: float = WAIT_TIMEOUT) -> bool:
+    """Take the target's transaction-scoped advisory lock, waiting up to ``timeout``
+
+    Serializes captioning of one target across processes; the lock is
+    released when the caller's transaction ends (or its connection dies).
+    Returns False on timeout so the caller can do the work anyway. Other
+    databases have no advisory locks and always return True.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    lock = func.pg_try_advisory_xact_lock(func.hashtext("precaption"), func.hashtext(target_id))
+    deadline = time.monotonic() + timeout
+    while not db.execute(select(lock)).scalar_one():
+        if time.monotonic() >= deadline:
+            logger.warning(f"Gave up waiting {timeout}s for target {target_id} pre-captioning")
+            return False
+        time.sleep(LOCK_POLL)
+    return True
+
+def _run(target_id: str):
+    with get_db() as db:
+        lock_target(db, target_id)
+        tgt = db.execute(select(Target).where(Target.target_id==target_id)).scalar_one()
+        prepare_target(db, tgt)
+    logger.info(f"Target {target_id} pre-captioned")
+
+def _done(target_id: str, fut: Future):
+    with _lock:
+        if _inflight.get(target_id) is fut:
+            del _inflight[target_id]
+    if not fut.cancelled() and fut.exception():
+        logger.error(f"Pre-captioning target {target_id} failed: {fut.exception()}")
+
+def submit(target_id: str) -> Future | None:
+    """Queue a target for captioning; returns the in-flight job if there is one"""
+    global _executor
+    if WORKERS <= 0:
+        return None
+    with _lock:
+        fut = _inflight.get(target_id)
+        if fut is not None:
+            return fut
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix="precaption")
+        fut = _executor.submit(_run, target_id)
+        _inflight[target_id] = fut
+    fut.add_done_callback(lambda f: _done(target_id, f))
+    return fut
+
+def wait(target_id: str, timeout: float = WAIT_TIMEOUT) -> bool:
+    """Block until this process's in-flight job for the target finishes
+
+    Returns True if a job was waited on and succeeded. Failures and
+    timeouts return False so the caller can do the work itself. Jobs in
+    other processes are covered by :func:`lock_target`.
+    """
+    with _lock:
+        fut = _inflight.get(target_id)
+    if fut is None:
+        return False
+    try:
+        fut.result(timeout=timeout)
+        return True
+    except TimeoutError:
+        logger.warning(f"Gave up waiting {timeout}s for target {target_id} pre-captioning")
+    except Exception:
+        pass  # already logged by _done
+    return False
+
+def shutdown():
+    """Stop the worker pool, dropping queued jobs (they are redone at finish)"""
+    global _executor
+    with _lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -1,60 +1,87 @@
 import numpy as np
-import json
-from app.services.ai import embed
+import json, hashlib
+from app.services.ai import embed, embed_many, embedding_model
 
 def cosine(a, b):
     """Calculate the cosine similarity between two vectors"""
     a, b = np.array(a), np.array(b)
     return float(a.dot(b) / (np.linalg.norm(a) * np.linalg.norm(b)))
 
-def score(notes: str, desc: dict) -> dict:
+def cosine_many(v, mat) -> np.ndarray:
+    """Cosine similarity of vector ``v`` against every row of ``mat``"""
+    v = np.asarray(v, dtype=np.float64)
+    mat = np.asarray(mat, dtype=np.float64)
+    return mat @ v / (np.linalg.norm(mat, axis=1) * np.linalg.norm(v))
+
+# Order of the per-target vectors: full description, then rubric categories
+VECTOR_KEYS = ("full", "color", "shape", "concept", "sensory")
+
+def category_texts(desc: dict) -> dict:
+    """Build the texts that get embedded for a target description
+
+    ``full`` is the whole description; the other keys are the rubric
+    categories, each phrased with extra context so the embedding focuses
+    on that aspect of the image.
+    """
+    return {
+        "full": json.dumps(desc),
+        "color": f"Colors present in the image: {', '.join(desc['colors'])}",
+        "shape": f"Shapes and forms in the image: {', '.join(desc['shapes'])}",
+        "concept": f"Objects and items in the image: {', '.join(desc['objects'])}",
+        "sensory": f"Setting and atmosphere of the image: {desc['setting']}. Materials present: {', '.join(desc['materials'])}",
+    }
+
+def caption_hash(desc: dict) -> str:
+    """Stable hash of a caption, used to spot stale target vectors"""
+    return hashlib.sha256(json.dumps(desc, sort_keys=True).encode()).hexdigest()
+
+def target_vectors(desc: dict, stored: dict | None = None) -> tuple[dict, bool]:
+    """Return the per-target vectors for a caption, reusing ``stored`` if valid
+
+    A record is ``{"model", "caption_hash", "vectors"}`` where ``vectors`` is
+    a (len(VECTOR_KEYS), dim) array, as persisted on the ``Target`` row. It
+    is only reused when it was built from the same caption with the same
+    embedding model. Returns ``(record, fresh)`` where ``fresh`` tells the
+    caller the record was recomputed and should be saved.
+    """
+    key, model = caption_hash(desc), embedding_model()
+    if (stored and stored.get("vectors") is not None
+            and stored.get("model") == model and stored.get("caption_hash") == key):
+        return stored, False
+    texts = category_texts(desc)
+    vectors = np.asarray(embed_many([texts[k] for k in VECTOR_KEYS]), dtype=np.float32)
+    return {"model": model, "caption_hash": key, "vectors": vectors}, True
+
+def score(notes: str, desc: dict, target_vecs: dict | None = None, notes_emb=None) -> dict:
     """Score the similarity between user notes and target description
-    
+
     This improved version evaluates each category separately by creating
     focused embeddings for specific aspects of the image description.
+    All texts are embedded in one batched request. When ``target_vecs``
+    (the ``vectors`` matrix of a :func:`target_vectors` record) is given,
+    only the notes are embedded, or nothing if ``notes_emb`` is given too.
     """
-    # Get embeddings for the notes
-    notes_emb = embed(notes)
-    
+    if target_vecs is None:
+        texts = category_texts(desc)
+        notes_emb, *target_embs = embed_many([notes, *(texts[k] for k in VECTOR_KEYS)])
+        target_vecs = target_embs
+    elif notes_emb is None:
+        notes_emb = embed(notes)
+    sims = dict(zip(VECTOR_KEYS, cosine_many(notes_emb, target_vecs).tolist()))
+
     # Calculate overall similarity
-    full_desc = json.dumps(desc)
-    full_desc_emb = embed(full_desc)
-    cos = cosine(notes_emb, full_desc_emb)
-    
-    # Calculate category-specific similarities
-    rubric = {}
-    
-    # Color similarity - add more context to help embeddings focus better
-    color_text = f"Colors present in the image: {', '.join(desc['colors'])}"
-    color_emb = embed(color_text)
-    color_sim = cosine(notes_emb, color_emb)
+    cos = sims.pop("full")
+
+    # Calculate category-specific similarities (color, shape, concept, sensory)
     # Apply a stricter threshold to improve discrimination
-    rubric["color"] = min(int(max(0, color_sim - 0.3) * 4), 3)
-    
-    # Shape similarity
-    shape_text = f"Shapes and forms in the image: {', '.join(desc['shapes'])}"
-    shape_emb = embed(shape_text)
-    shape_sim = cosine(notes_emb, shape_emb)
-    rubric["shape"] = min(int(max(0, shape_sim - 0.3) * 4), 3)
-    
-    # Object/concept similarity
-    concept_text = f"Objects and items in the image: {', '.join(desc['objects'])}"
-    concept_emb = embed(concept_text)
-    concept_sim = cosine(notes_emb, concept_emb)
-    rubric["concept"] = min(int(max(0, concept_sim - 0.3) * 4), 3)
-    
-    # Sensory/setting similarity
-    sensory_text = f"Setting and atmosphere of the image: {desc['setting']}. Materials present: {', '.join(desc['materials'])}"
-    sensory_emb = embed(sensory_text)
-    sensory_sim = cosine(notes_emb, sensory_emb)
-    rubric["sensory"] = min(int(max(0, sensory_sim - 0.3) * 4), 3)
-    
+    rubric = {k: min(int(max(0, sim - 0.3) * 4), 3) for k, sim in sims.items()}
+
     # Calculate total score (weighted average with higher weight on overall similarity)
     # Apply a curve to make discrimination better between good and poor matches
     total = 0.5 * max(0, cos - 0.25) * 4 + 0.5 * sum(rubric.values()) / len(rubric)
-    
+
     return {
         "cosine": cos,
         "rubric": rubric,
         "total": round(total, 3)
-    } 
\ No newline at end of file
+    }
@@ -0,0 +1,51 @@
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+from app.models.session import Session as SessionModel
+from app.models.target import Target
+from app.services import pipeline
+from app.services.ai import embed, embedding_model
+from app.services.notes import session_notes
+from app.services.score import score
+
+def score_session(db: Session, sid: int) -> dict:
+    """Score the session's notes against its target and store the result
+
+    Targets are normally captioned and embedded in the background right
+    after creation (see app.services.pipeline); if that job is still
+    running, in this process or another, we wait for it rather than repeat
+    it. Otherwise the caption
+    (memoized by image content) and the category vectors are produced
+    here and kept on the target row, so later sessions only embed notes.
+    A captioning failure raises, so the scoring job is retried rather than
+    scored against the placeholder caption. The notes embedding is kept
+    on the session for app.services.stats. The caller owns the transaction.
+    """
+    ses = db.execute(select(SessionModel).where(SessionModel.session_id==sid)).scalar_one()
+    pipeline.wait(ses.target_id)
+    pipeline.lock_target(db, ses.target_id)
+    tgt = db.execute(select(Target).where(Target.target_id==ses.target_id)).scalar_one()
+    desc, vecs = pipeline.prepare_target(db, tgt, fallback=False)
+    notes = session_notes(db, sid)
+    notes_emb = embed(notes)
+    res = score(notes, desc, vecs["vectors"], notes_emb)
+
+    db.execute(update(SessionModel).where(SessionModel.session_id==sid)
+                .values(rubric=res["rubric"], total_score=res["total"], status="scored",
+                        notes_embedding=notes_emb, notes_embedding_model=embedding_model()))
+    return res
+
+def list_sessions_stmt(columns: list, status: str = None, target_id: str = None,
+                       before: int = None, limit: int = 50):
+    """One page of ``columns`` of sessions, newest first, for keyset pagination
+
+    ``before`` is the cursor: the last session id of the previous page.
+    Filtering on "open" or "scoring" walks the matching partial index.
+    """
+    q = select(*columns)
+    if status is not None:
+        q = q.where(SessionModel.status == status)
+    if target_id is not None:
+        q = q.where(SessionModel.target_id == target_id)
+    if before is not None:
+        q = q.where(SessionModel.session_id < before)
+    return q.order_by(SessionModel.session_id.desc()).limit(limit)
@@ -0,0 +1,97 @@
+import os
+import numpy as np
+from sqlalchemy import select, type_coerce, LargeBinary
+from sqlalchemy.orm import Session
+from app.models.session import Session as SessionModel
+from app.models.target import Target
+from app.models.types import unpack_many, unpack_vectors
+from app.services.ai import embed_cached, embedding_model
+from app.services.judge import normalize_rows
+from app.services.notes import notes_by_session
+from app.services.score import VECTOR_KEYS
+
+DEFAULT_PERMUTATIONS = int(os.getenv("RV_STATS_PERMUTATIONS", "20000"))
+# Cap on the (permutations x sessions) block gathered at once
+CHUNK_CELLS = 4_000_000
+
+def permutation_test(notes_mat, target_mat, permutations: int = DEFAULT_PERMUTATIONS,
+                     seed: int | None = None) -> dict:
+    """Monte Carlo test of whether notes match their own targets above chance
+
+    Row i of ``notes_mat`` belongs to row i of ``target_mat``. The statistic
+    is the mean cosine between each session's notes and its target. The
+    null distribution comes from shuffling which target each set of notes
+    is paired with. The full similarity matrix is computed once; every
+    permutation is then just a gather and mean, done in vectorized blocks.
+    """
+    notes = normalize_rows(notes_mat)
+    targets = normalize_rows(target_mat)
+    n = len(notes)
+    if n < 2:
+        raise ValueError("Need at least two sessions for a permutation test")
+
+    sims = notes @ targets.T
+    rows = np.arange(n)
+    observed = float(sims[rows, rows].mean())
+
+    rng = np.random.default_rng(seed)
+    null = np.empty(permutations, dtype=np.float64)
+    block = max(1, CHUNK_CELLS // n)
+    for start in range(0, permutations, block):
+        size = min(block, permutations - start)
+        perms = rng.permuted(np.broadcast_to(rows, (size, n)), axis=1)
+        null[start:start + size] = sims[rows, perms].mean(axis=1)
+
+    std = null.std()
+    return {
+        "sessions": n,
+        "permutations": permutations,
+        "observed": observed,
+        "null_mean": float(null.mean()),
+        "null_std": float(std),
+        "z_score": float((observed - null.mean()) / std) if std else 0.0,
+        "p_value": float((np.count_nonzero(null >= observed) + 1) / (permutations + 1)),
+    }
+
+def history_significance(db: Session, permutations: int = DEFAULT_PERMUTATIONS,
+                         seed: int | None = None) -> dict:
+    """Run :func:`permutation_test` over every scored session in the database
+
+    Only stored vectors are used: target vectors stored on ``targets`` and
+    notes vectors stored on ``sessions`` when they were scored, both by the
+    active embedding model. Sessions scored before notes vectors were kept
+    fall back to the embedding cache; ones found nowhere are skipped rather
+    than sent to the API.
+    """
+    model = embedding_model()
+    rows = db.execute(
+        select(SessionModel.session_id, SessionModel.total_score,
+               type_coerce(Target.embeddings, LargeBinary),
+               type_coerce(SessionModel.notes_embedding, LargeBinary),
+               SessionModel.notes_embedding_model)
+        .join(Target, Target.target_id == SessionModel.target_id)
+        .where(SessionModel.status == "scored",
+               Target.embeddings.is_not(None),
+               Target.embedding_model == model)
+        .order_by(SessionModel.session_id)
+    ).all()
+
+    found = {i: unpack_vectors(r[3])[0] for i, r in enumerate(rows)
+             if r[3] is not None and r[4] == model}
+    older = [i for i in range(len(rows)) if i not in found]
+    if older:
+        notes = notes_by_session(db, [rows[i][0] for i in older])
+        cached = embed_cached([notes.get(rows[i][0], "") for i in older])
+        found.update((older[j], vec) for j, vec in cached.items())
+    kept = [i for i in range(len(rows)) if i in found]
+    if len(kept) < 2:
+        return {"sessions": len(kept), "skipped": len(rows) - len(kept),
+                "p_value": None, "detail": "Not enough scored sessions with stored embeddings"}
+
+    full = VECTOR_KEYS.index("full")
+    targets = unpack_many([rows[i][2] for i in kept])[:, full, :]
+    notes = np.asarray([found[i] for i in kept], dtype=np.float32)
+    result = permutation_test(notes, targets, permutations, seed)
+    result["skipped"] = len(rows) - len(kept)
+    result["mean_total_score"] = float(np.mean([rows[i][1] for i in kept]))
+    return result
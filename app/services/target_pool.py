@@ -0,0 +1,109 @@
+"""
+Pre-warmed target pool
+--------------------------------------------------
+Keeps RV_TARGET_POOL_SIZE targets downloaded, verified and (through the
+pre-caption pipeline) captioned ahead of time, so POST /targets/random only
+has to claim one. Pool targets are rows with `claimed_at IS NULL`; a claim
+sets `claimed_at` in a single UPDATE over a `FOR UPDATE SKIP LOCKED`
+subquery, so concurrent sessions never get the same target and never wait
+on each other's locks.
+
+After every claim a background task on the app's event loop tops the pool
+back up. If the pool is empty a target is created inline, so a claim always
+succeeds as long as the source works. Set RV_TARGET_SOURCE=local to fill
+the pool from RV_TARGET_DIR when offline.
+"""
+import os, asyncio, logging
+from sqlalchemy import select, update, func
+from sqlalchemy.orm import Session
+from app.db.session import get_async_db
+from app.models.target import Target
+from app.services.targets import acreate_target, TargetUnavailableError
+
+POOL_SIZE = int(os.getenv("RV_TARGET_POOL_SIZE", "5"))
+
+logger = logging.getLogger(__name__)
+
+_refill_task: asyncio.Task | None = None
+
+def _claim_stmt():
+    """UPDATE … RETURNING that takes the best unclaimed target, skipping locked rows"""
+    pick = (select(Target.target_id)
+            .where(Target.claimed_at.is_(None))
+            .order_by((Target.caption_status == "ready").desc(), Target.created_at)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+            .scalar_subquery())
+    return (update(Target)
+            .where(Target.target_id == pick, Target.claimed_at.is_(None))
+            .values(claimed_at=func.now())
+            .returning(Target.target_id))
+
+def _available_stmt():
+    return select(func.count()).select_from(Target).where(Target.claimed_at.is_(None))
+
+def claim(db: Session) -> str | None:
+    """Atomically take the oldest unclaimed target; None if the pool is empty
+
+    Captioned targets are preferred so finish has nothing left to do.
+    The caller owns the transaction.
+    """
+    return db.execute(_claim_stmt()).scalar_one_or_none()
+
+def available(db: Session) -> int:
+    """Number of unclaimed targets in the pool"""
+    return db.execute(_available_stmt()).scalar_one()
+
+async def _claim_once() -> str | None:
+    async with get_async_db() as db:
+        return (await db.execute(_claim_stmt())).scalar_one_or_none()
+
+async def _available() -> int:
+    async with get_async_db() as db:
+        return (await db.execute(_available_stmt())).scalar_one()
+
+async def claim_target(attempts: int = 3) -> str:
+    """Claim a pool target for a new session, creating one if the pool is dry"""
+    try:
+        for _ in range(attempts):
+            trn = await _claim_once()
+            if trn is not None:
+                return trn
+            logger.warning("Target pool is empty, creating a target inline")
+            await acreate_target()
+        raise TargetUnavailableError("Could not claim a target")
+    finally:
+        start_refill()
+
+async def refill(size: int = POOL_SIZE) -> int:
+    """Create targets until the pool holds ``size``; returns how many were added
+
+    Downloads run concurrently on the shared HTTP client.
+    """
+    missing = size - await _available()
+    if missing <= 0:
+        return 0
+    results = await asyncio.gather(*(acreate_target() for _ in range(missing)),
+                                   return_exceptions=True)
+    errors = [r for r in results if isinstance(r, Exception)]
+    if errors:
+        logger.error(f"Target pool refill: {len(errors)} target(s) failed, e.g. {errors[0]}")
+    added = len(results) - len(errors)
+    if added:
+        logger.info(f"Target pool refilled with {added} target(s)")
+    return added
+
+def start_refill():
+    """Top the pool up in a background task (no-op if one is already running)
+
+    Must be called from the app's event loop.
+    """
+    global _refill_task
+    if POOL_SIZE <= 0 or (_refill_task is not None and not _refill_task.done()):
+        return
+    _refill_task = asyncio.get_running_loop().create_task(refill())
+    _refill_task.add_done_callback(_log_refill_error)
+
+def _log_refill_error(task: asyncio.Task):
+    if not task.cancelled() and task.exception():
+        logger.error(f"Target pool refill failed: {task.exception()}")
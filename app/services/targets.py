@@ -1,15 +1,93 @@
-import uuid, httpx, asyncio, logging, os
+import uuid, httpx, asyncio, logging, os, random, tempfile, contextlib
 from pathlib import Path
 from sqlalchemy import insert
 from app.models.target import Target
-from app.db.session import get_db
-from PIL import Image
+from app.db.session import get_async_db, async_engine
+from app.services import pipeline
+from app.services.image_store import get_store, DuplicateImageError
+from PIL import Image, ImageFile
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-async def _download_image(max_retries=3):
-    """Download a random image from Lorem Picsum and save it locally"""
+# Where new targets come from: "picsum" (download) or "local" (RV_TARGET_DIR)
+TARGET_SOURCE = os.getenv("RV_TARGET_SOURCE", "picsum")
+TARGET_DIR    = os.getenv("RV_TARGET_DIR", "app/data/library")
+IMAGE_SUFFIXES = {".jpg", ".jpeg", ".png", ".webp", ".gif"}
+
+# Picsum answers with a redirect, then serves a ~50 KB JPEG
+DOWNLOAD_TIMEOUT = float(os.getenv("RV_DOWNLOAD_TIMEOUT", "15"))
+HTTP_OPTIONS = {
+    # Note: follow_redirects is critical for Picsum which returns 302s
+    "follow_redirects": True,
+    "timeout": httpx.Timeout(DOWNLOAD_TIMEOUT, connect=5.0),
+    "limits": httpx.Limits(max_connections=10, max_keepalive_connections=10),
+}
+
+# Hard cap per download, and how many bytes may pass without a known image header
+MAX_IMAGE_BYTES = int(os.getenv("RV_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+HEADER_BYTES    = 64 * 1024
+
+_http = None
+
+class TargetUnavailableError(RuntimeError):
+    """The target source could not produce a new image"""
+
+def get_http_client() -> httpx.AsyncClient:
+    """Shared keep-alive client for image downloads on the app's event loop"""
+    global _http
+    if _http is None or _http.is_closed:
+        _http = httpx.AsyncClient(**HTTP_OPTIONS)
+    return _http
+
+async def close_http_client():
+    global _http
+    if _http is not None:
+        await _http.aclose()
+        _http = None
+
+async def fetch_image(c: httpx.AsyncClient, url: str, dest: Path,
+                      max_bytes: int = MAX_IMAGE_BYTES) -> int:
+    """Stream an image to ``dest``, validating it as the bytes arrive
+
+    The body goes to a temp file next to ``dest`` and through a PIL
+    incremental parser at the same time, so nothing is read back from disk.
+    Downloads over ``max_bytes``, or that still aren't a recognizable image
+    after the first chunk of header bytes, are aborted early. The file is
+    moved into place atomically only once the parser accepts the complete
+    image; on any failure the temp file is removed. Returns the size.
+    """
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=dest.parent, prefix=f".{dest.name}.", suffix=".part")
+    try:
+        parser, size = ImageFile.Parser(), 0
+        with os.fdopen(fd, "wb") as f:
+            async with c.stream("GET", url) as response:
+                response.raise_for_status()  # Raises exception for 4XX/5XX responses
+                declared = int(response.headers.get("content-length") or 0)
+                if declared > max_bytes:
+                    raise ValueError(f"Image too large ({declared} bytes)")
+                async for chunk in response.aiter_bytes():
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise ValueError(f"Image larger than {max_bytes} bytes")
+                    parser.feed(chunk)
+                    if parser.image is None and size >= HEADER_BYTES:
+                        raise ValueError("Not a recognizable image")
+                    f.write(chunk)
+        if size == 0:
+            raise ValueError("Downloaded image is empty (0 bytes)")
+        parser.close().close()  # raises if the image is truncated or corrupt
+        os.replace(tmp, dest)
+        return size
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(tmp)
+        raise
+
+async def _download_image(c: httpx.AsyncClient, max_retries=3):
+    """Download a random, not previously seen image from Lorem Picsum into the image store"""
+    store = get_store()
     retries = 0
     
     while retries < max_retries:
@@ -17,87 +95,95 @@ async def _download_image(max_retries=3):
         SEED = str(uuid.uuid4().int % 10**8).zfill(8)
         WIDTH = HEIGHT = 512
         URL = f"https://picsum.photos/seed/{SEED}/{WIDTH}/{HEIGHT}"
-        img_path = Path("app/data/targets") / f"{SEED}.jpg"
+        img_path = store.root / "incoming" / f"{SEED}.jpg"
         
         logger.info(f"Downloading random image (seed: {SEED}), attempt {retries + 1}/{max_retries}")
         
-        # Download the image
+        # Download and validate, then file it in the store by content
         try:
-            # Note: follow_redirects is critical for Picsum which returns 302s
-            async with httpx.AsyncClient(follow_redirects=True) as c:
-                response = await c.get(URL)
-                response.raise_for_status()  # Raises exception for 4XX/5XX responses
-                
-                # Ensure the directory exists and write the file
-                img_path.parent.mkdir(parents=True, exist_ok=True)
-                img_path.write_bytes(response.content)
-                
-                # Get file size
-                file_size = img_path.stat().st_size
-                logger.info(f"Image downloaded ({file_size} bytes)")
-                
-                # Validate image is not empty and is a valid image file
-                if file_size == 0:
-                    logger.warning(f"Downloaded image is empty (0 bytes), retrying...")
-                    if img_path.exists():
-                        os.remove(img_path)
-                    retries += 1
-                    continue
-                
-                # Verify it's a valid image by trying to open it
-                try:
-                    img = Image.open(img_path)
-                    img.verify()  # Verify it's a valid image
-                    # If we reach here, we have a valid, non-empty image
-                    return SEED, str(img_path)
-                except Exception as img_err:
-                    logger.warning(f"Downloaded file is not a valid image: {img_err}")
-                    if img_path.exists():
-                        os.remove(img_path)
-                    retries += 1
-                    continue
-                
+            file_size = await fetch_image(c, URL, img_path)
+            logger.info(f"Image downloaded ({file_size} bytes)")
+            stored = await asyncio.to_thread(store.put, str(img_path), True)
+            return SEED, stored.path, stored.sha256
+        except DuplicateImageError as e:
+            # Picsum serves the same photo under many seeds
+            logger.warning(f"Skipping duplicate image (seed: {SEED}): {e}")
+            retries += 1
         except Exception as e:
             logger.error(f"Error downloading image: {e}")
-            if img_path.exists():
-                os.remove(img_path)
             retries += 1
+        finally:
+            img_path.unlink(missing_ok=True)
     
-    # If we exhausted all retries, use a fallback
-    logger.error(f"Failed to download a valid image after {max_retries} attempts, using fallback")
-    SEED = "fallback"
-    img_path = Path("app/data/targets") / "fallback.jpg"
-    if not img_path.exists():
-        # Create a minimal valid fallback image (1×1 black pixel)
+    # Never pool a placeholder: it would be handed out as a real target
+    raise TargetUnavailableError(f"Failed to download a valid image after {max_retries} attempts")
+
+def _local_image():
+    """Copy a random, not previously used image from RV_TARGET_DIR into the store
+
+    Files are tried in random order until one is new, so this only fails
+    once every image in the directory has been used.
+    """
+    files = [p for p in Path(TARGET_DIR).rglob("*") if p.suffix.lower() in IMAGE_SUFFIXES]
+    if not files:
+        raise FileNotFoundError(f"No images found in {TARGET_DIR}")
+    store = get_store()
+    random.shuffle(files)
+    for img_path in files:
         try:
-            img = Image.new('RGB', (1, 1), color='black')
-            img_path.parent.mkdir(parents=True, exist_ok=True)
-            img.save(img_path)
-            logger.info(f"Created fallback image ({img_path.stat().st_size} bytes)")
+            with Image.open(img_path) as img:
+                img.verify()
+            stored = store.put(str(img_path))
+        except DuplicateImageError as e:
+            logger.debug(f"Skipping {img_path}: {e}")
+            continue
         except Exception as e:
-            logger.error(f"Error creating fallback image: {e}")
-            # Just create an empty file as last resort
-            img_path.touch()
-    
-    return SEED, str(img_path)
+            logger.warning(f"Skipping unreadable image {img_path}: {e}")
+            continue
+        SEED = str(uuid.uuid4().int % 10**8).zfill(8)
+        return SEED, stored.path, stored.sha256
+    raise TargetUnavailableError(f"Every image in {TARGET_DIR} has already been used")
 
-def create_target():
-    """Create a new random target with a Lorem Picsum image"""
-    # Run the async download in a new event loop
-    loop = asyncio.new_event_loop()
-    try:
-        SEED, img_path = loop.run_until_complete(_download_image())
-    finally:
-        loop.close()
-    
-    # Save to database with placeholder caption (GPT-Vision will fill later)
-    caption = {"placeholder": "unknown"}
-    
-    with get_db() as s:
-        s.execute(insert(Target).values(
+async def _insert_target(SEED: str, img_path: str, image_hash: str = None):
+    # Save to database; the caption stays "pending" until GPT-Vision fills it
+    async with get_async_db() as s:
+        await s.execute(insert(Target).values(
             target_id=SEED,
             image_url=img_path,
-            caption=caption
+            image_hash=image_hash,
+            caption={},
+            caption_status="pending"
         ))
-    
-    return SEED 
\ No newline at end of file
+
+async def acreate_target(source: str = TARGET_SOURCE, client: httpx.AsyncClient = None) -> str:
+    """Create a new random target from Lorem Picsum or a local image directory
+
+    Images are filed in the content-addressed store (app.services.image_store)
+    and near-duplicates of earlier targets are skipped. Runs on the caller's
+    event loop with the shared HTTP client and the async engine; blocking
+    file work is pushed to threads. The target is unclaimed, i.e. it joins
+    the pool (see app.services.target_pool).
+    """
+    if source == "local":
+        SEED, img_path, image_hash = await asyncio.to_thread(_local_image)
+    elif source == "picsum":
+        SEED, img_path, image_hash = await _download_image(client or get_http_client())
+    else:
+        raise ValueError(f"Unknown RV_TARGET_SOURCE {source!r}; choose picsum or local")
+
+    await _insert_target(SEED, img_path, image_hash)
+
+    # Caption and embed while the user is still viewing
+    pipeline.submit(SEED)
+    return SEED
+
+def create_target(source: str = TARGET_SOURCE) -> str:
+    """Blocking acreate_target() for scripts and code without an event loop"""
+    async def _run():
+        try:
+            async with httpx.AsyncClient(**HTTP_OPTIONS) as client:
+                return await acreate_target(source, client)
+        finally:
+            # Pooled asyncpg connections can't outlive this event loop
+            await async_engine.dispose()
+    return asyncio.run(_run())
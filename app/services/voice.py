@@ -1,43 +1,37 @@
 import os, io, subprocess, tempfile, logging
 import sounddevice as sd
 import numpy as np
-import openai
 import wave
 import asyncio
 from dotenv import load_dotenv
+from app.services import openai_client
 
 # Load environment variables
 load_dotenv()
 api_key = os.getenv("OPENAI_API_KEY")
 if not api_key:
     logging.warning("OPENAI_API_KEY not found in environment variables. Voice features will not work.")
-else:
-    openai.api_key = api_key
 
 # ── Text-to-Speech  → returns local file path ───────────────────────────
 async def speak(text: str, voice="alloy", model="tts-1") -> str:
     """Convert text to speech using OpenAI's TTS API and play it"""
-    if not openai.api_key:
+    if not api_key:
         print("Error: OpenAI API key not set. Please set OPENAI_API_KEY environment variable.")
         print(f"Would have said: '{text}'")
         return None
     
     try:
-        # Use the current OpenAI API format
-        client = openai.OpenAI(api_key=api_key)
-        
-        # Create speech synchronously for simplicity
-        response = client.audio.speech.create(
+        # Shared client: reuses the pooled connection across prompts
+        response = await openai_client.acall("speech", lambda c: c.audio.speech.create(
             model=model,
             voice=voice,
             input=text
-        )
+        ))
         
         # Save the audio to a temporary file
         fd, path = tempfile.mkstemp(suffix=".mp3")
         with os.fdopen(fd, "wb") as f:
-            # Use the buffer directly
-            response.stream_to_file(path)
+            f.write(response.content)
         
         # Play the audio with macOS built-in player
         subprocess.run(["afplay", path], check=False)
@@ -50,7 +44,7 @@ async def speak(text: str, voice="alloy", model="tts-1") -> str:
 # ── Record → Whisper STT ────────────────────────────────────────────────
 async def listen(seconds: int = 10, sample_rate: int = 16000) -> str:
     """Record audio and transcribe it using OpenAI's Whisper API"""
-    if not openai.api_key:
+    if not api_key:
         print("Error: OpenAI API key not set. Please set OPENAI_API_KEY environment variable.")
         simulated_input = input("🎤 (API key missing) Type what you would say: ")
         return simulated_input.strip()
@@ -72,14 +66,11 @@ async def listen(seconds: int = 10, sample_rate: int = 16000) -> str:
             wf.writeframes(samples.tobytes())
         buf.seek(0)
         
-        # Create a client with the current API
-        client = openai.OpenAI(api_key=api_key)
-        
-        # Call the Whisper API
-        response = client.audio.transcriptions.create(
+        # Call the Whisper API on the shared client
+        response = await openai_client.acall("transcriptions", lambda c: c.audio.transcriptions.create(
             model="whisper-1", 
-            file=("speech.wav", buf, "audio/wav")
-        )
+            file=("speech.wav", buf.getvalue(), "audio/wav")
+        ))
         
         transcribed_text = response.text.strip()
         print(f"Heard: '{transcribed_text}'")
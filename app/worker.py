@@ -0,0 +1,62 @@
+"""
+Scoring worker
+--------------------------------------------------
+Runs queued scoring jobs (see app.services.jobs) on N threads:
+
+    python -m app.worker --concurrency 4
+
+Run as many worker processes as scoring load needs, on any host that can
+reach the database; they share the queue without double-claiming. SIGINT
+or SIGTERM stops claiming and lets the running jobs finish.
+"""
+import os, signal, socket, logging, argparse, threading
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+# Load environment variables before the app modules read their settings
+load_dotenv()
+
+from app.db.session import engine
+from app.services import jobs, pipeline
+
+CONCURRENCY = int(os.getenv("RV_SCORING_WORKERS", "4"))
+# Idle workers check the queue this often (seconds)
+POLL = float(os.getenv("RV_SCORING_POLL", "1"))
+
+logger = logging.getLogger(__name__)
+
+def work(worker: str, stop: threading.Event):
+    """Run jobs until ``stop`` is set, sleeping while the queue is empty"""
+    while not stop.is_set():
+        try:
+            if jobs.run_once(worker):
+                continue
+        except Exception as e:
+            # Database unreachable and the like; the job (if any) keeps its lease
+            logger.error(f"Worker {worker}: {e}")
+        stop.wait(POLL)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--concurrency", type=int, default=CONCURRENCY, help="Jobs run at once")
+    args = ap.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    stop = threading.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, lambda *_: stop.set())
+
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"Scoring worker {prefix} started with {args.concurrency} thread(s)")
+    with ThreadPoolExecutor(max_workers=args.concurrency, thread_name_prefix="scoring") as ex:
+        for i in range(args.concurrency):
+            ex.submit(work, f"{prefix}:{i}", stop)
+        # Keep the main thread responsive to signals
+        while not stop.wait(1):
+            pass
+    pipeline.shutdown()
+    engine.dispose()
+    logger.info(f"Scoring worker {prefix} stopped")
+
+if __name__ == "__main__":
+    main()
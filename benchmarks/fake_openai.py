@@ -0,0 +1,121 @@
+"""
+Local stand-in for the OpenAI HTTP API
+--------------------------------------------------
+Serves just enough of `/v1/embeddings` and `/v1/chat/completions` for the
+scoring and captioning paths, with configurable injected latency. Every
+request is counted per endpoint, together with its request body size, so
+benchmarks can report round trips and upload bytes per operation.
+"""
+import os, json, time, zlib, threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+from app.services import openai_client
+
+CAPTION = {
+    "objects": ["mountain", "lake", "trees"],
+    "colors": ["blue", "green", "white"],
+    "shapes": ["triangular", "organic"],
+    "materials": ["rock", "water"],
+    "setting": "outdoor mountain landscape with a lake",
+}
+
+class FakeOpenAI:
+    """Threaded fake OpenAI server; use as a context manager
+
+    While active, the shared OpenAI client (and any client built from the
+    environment) points at the fake server.
+    """
+
+    def __init__(self, latency: float = 0.05, dim: int = 1536):
+        self.latency = latency
+        self.dim = dim
+        self.calls = Counter()
+        self.bytes_in = Counter()
+        self._lock = threading.Lock()
+        self._server = None
+        self._saved = {}
+
+    # ── Fake responses ──────────────────────────────────────────────────
+    def _vector(self, text: str) -> list[float]:
+        rng = np.random.default_rng(zlib.crc32(text.encode()))
+        return (rng.normal(size=self.dim) / np.sqrt(self.dim)).round(6).tolist()
+
+    def _embeddings(self, body: dict) -> dict:
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        return {
+            "object": "list",
+            "model": body["model"],
+            "data": [{"object": "embedding", "index": i, "embedding": self._vector(t)}
+                     for i, t in enumerate(inputs)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    def _chat(self, body: dict) -> dict:
+        return {
+            "id": "chatcmpl-fake", "object": "chat.completion", "created": 0,
+            "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": json.dumps(CAPTION)}}],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def _handler(self):
+        fake = self
+        routes = {"/v1/embeddings": self._embeddings, "/v1/chat/completions": self._chat}
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                route = routes.get(self.path)
+                with fake._lock:
+                    fake.calls[self.path] += 1
+                    fake.bytes_in[self.path] += len(raw)
+                time.sleep(fake.latency)
+                if route is None:
+                    self.send_error(404)
+                    return
+                payload = json.dumps(route(json.loads(raw))).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    # ── Lifecycle ───────────────────────────────────────────────────────
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1/"
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+            self.bytes_in.clear()
+
+    def __enter__(self):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        self._saved = {k: os.environ.get(k) for k in ("OPENAI_BASE_URL", "OPENAI_API_KEY")}
+        os.environ["OPENAI_BASE_URL"] = self.base_url
+        os.environ["OPENAI_API_KEY"] = "sk-fake"
+        openai_client.reset()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+        for k, v in self._saved.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+        openai_client.reset()
@@ -0,0 +1,225 @@
+"""
+Benchmarks for the scoring and captioning hot paths
+--------------------------------------------------
+Runs score(), describe_image() and the finish job (score_session) against
+a local fake OpenAI server with injected latency, and reports per-op API
+calls, upload bytes, wall time, p50/p99 latency and peak Python memory.
+Also times GET /sessions over a few thousand rows, both the typed route and
+the old ``ses.__dict__`` + jsonable_encoder version for comparison.
+
+    python -m benchmarks.run --latency 0.05 --out bench_output.json
+    python -m benchmarks.run --baseline bench_output.json   # exit 1 on regression
+
+A regression is any increase in API calls per op (e.g. someone adds a
+sequential embed() call) or a p50 slowdown beyond --tolerance.
+"""
+import argparse, json, sys, tempfile, time, platform, tracemalloc
+from datetime import datetime
+from pathlib import Path
+from unittest import mock
+import numpy as np
+from PIL import Image
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+
+from benchmarks.fake_openai import FakeOpenAI, CAPTION
+from app.api.schemas import SessionPage, SessionSummary, columns
+from app.models.base import Base
+from app.models.session import Session as SessionModel
+from app.models.note import SessionNote
+from app.models.target import Target
+from app.services.ai import describe_image
+from app.services.embed_cache import EmbeddingCache
+from app.services.embedders import OpenAIEmbedder
+from app.services.score import score, target_vectors
+from app.services.sessions import score_session, list_sessions_stmt
+
+LIST_ROWS = 5000
+
+NOTES = "[Stage 1] flowing, heavy\n[Stage 2] cold, blue, rough\n[Stage 3] tall pointed shape, flat surface"
+
+def make_image(path: Path, size: int = 512):
+    """Write a noisy JPEG the size of a picsum target"""
+    rng = np.random.default_rng(0)
+    pixels = rng.integers(0, 255, (size, size, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path, "JPEG", quality=85)
+
+def list_sessions_app(db_url: str) -> TestClient:
+    """GET /sessions the old way (/legacy) and the typed way (/typed) over one DB"""
+    engine = create_engine(db_url)
+    Base.metadata.create_all(engine)
+    make_session = sessionmaker(bind=engine)
+    now = datetime.now()
+    with make_session() as db:
+        db.execute(insert(Target).values(target_id="bench", image_url="x", caption={},
+                                         created_at=now))
+        db.execute(insert(SessionModel), [
+            {"target_id": "bench", "user_notes": "", "stage_durations": {"1": 15.0},
+             "rubric": {"sensory": 2, "shape": 1}, "total_score": 1.5,
+             "aols": [], "status": "scored", "ts": now} for _ in range(LIST_ROWS)])
+        db.commit()
+
+    app = FastAPI()
+
+    @app.get("/legacy")
+    def legacy():
+        with make_session() as db:
+            return [s.__dict__ for s in db.execute(select(SessionModel)).scalars()]
+
+    @app.get("/typed")
+    def typed() -> SessionPage:
+        with make_session() as db:
+            stmt = list_sessions_stmt(columns(SessionSummary, SessionModel), limit=LIST_ROWS)
+            return {"sessions": db.execute(stmt).all(), "next_cursor": None}
+
+    return TestClient(app)
+
+def measure(name: str, fn, iterations: int, fake: FakeOpenAI) -> dict:
+    """Time ``fn(i)`` for each iteration and collect API usage from the fake
+
+    ``fn`` is also called with -1 (warm-up) and ``iterations`` (memory trace).
+    """
+    fn(-1)  # warm-up: imports, connection setup, first-time caches
+    fake.reset()
+    times = []
+    for i in range(iterations):
+        t = time.perf_counter()
+        fn(i)
+        times.append(time.perf_counter() - t)
+    calls, sent = dict(fake.calls), dict(fake.bytes_in)
+
+    # tracemalloc slows everything down, so trace one extra op on its own
+    tracemalloc.start()
+    fn(iterations)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    ms = np.array(times) * 1000
+    return {
+        "name": name,
+        "iterations": iterations,
+        "wall_s": round(float(ms.sum()) / 1000, 4),
+        "mean_ms": round(float(ms.mean()), 3),
+        "p50_ms": round(float(np.percentile(ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(ms, 99)), 3),
+        "peak_mem_kb": round(peak / 1024, 1),
+        "calls_per_op": {k: v / iterations for k, v in sorted(calls.items())},
+        "upload_bytes_per_op": {k: round(v / iterations) for k, v in sorted(sent.items())},
+    }
+
+def run(latency: float, iterations: int) -> dict:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp, FakeOpenAI(latency=latency) as fake, \
+         mock.patch("app.services.ai.get_backend", return_value=OpenAIEmbedder()):
+        image = Path(tmp) / "target.jpg"
+        make_image(image)
+
+        # score() with no cache: every op pays for its embedding round trips
+        with mock.patch("app.services.ai.get_cache", return_value=None):
+            results.append(measure("score_cold", lambda i: score(f"{NOTES} {i}", CAPTION),
+                                   iterations, fake))
+
+            record, _ = target_vectors(CAPTION)
+            results.append(measure(
+                "score_stored_target_vectors",
+                lambda i: score(f"{NOTES} {i}", CAPTION, record["vectors"]),
+                iterations, fake))
+
+        # Rescoring identical notes should be served entirely from the cache
+        cache = EmbeddingCache(str(Path(tmp) / "emb.sqlite3"))
+        with mock.patch("app.services.ai.get_cache", return_value=cache):
+            results.append(measure("score_cached", lambda i: score(NOTES, CAPTION),
+                                   iterations, fake))
+
+        results.append(measure("describe_image", lambda i: describe_image(str(image)),
+                               iterations, fake))
+
+        # Whole finish job against an in-memory database
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        db = sessionmaker(bind=engine)()
+        now = datetime.now()
+        db.execute(insert(Target).values(target_id="bench", image_url=str(image),
+                                         caption={}, created_at=now))
+        sids = [db.execute(insert(SessionModel).values(
+                    target_id="bench", user_notes="", stage_durations={},
+                    rubric={}, total_score=0, aols=[], ts=now)).inserted_primary_key[0]
+                for i in range(iterations + 2)]
+        db.execute(insert(SessionNote), [
+            {"session_id": sid, "stage": 1, "text": f"{NOTES} {i}", "created_at": now}
+            for i, sid in enumerate(sids)])
+        db.commit()
+
+        def finish(i):
+            score_session(db, sids[i + 1])
+            db.commit()
+
+        with mock.patch("app.services.ai.get_cache", return_value=None):
+            results.append(measure("finish_job", finish, iterations, fake))
+        db.close()
+
+        api = list_sessions_app(f"sqlite:///{tmp}/sessions.db")
+        for route in ("legacy", "typed"):
+            results.append(measure(f"list_{LIST_ROWS}_sessions_{route}",
+                                   lambda i: api.get(f"/{route}").raise_for_status(),
+                                   iterations, fake))
+
+    return {
+        "meta": {
+            "latency_s": latency,
+            "iterations": iterations,
+            "python": platform.python_version(),
+            "created": datetime.now().isoformat(timespec="seconds"),
+        },
+        "benchmarks": results,
+    }
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """List regressions of ``current`` against ``baseline``"""
+    problems = []
+    now = {b["name"]: b for b in current["benchmarks"]}
+    for old in baseline["benchmarks"]:
+        new = now.get(old["name"])
+        if new is None:
+            problems.append(f"{old['name']}: missing from current run")
+            continue
+        for endpoint in set(old["calls_per_op"]) | set(new["calls_per_op"]):
+            before = old["calls_per_op"].get(endpoint, 0)
+            after = new["calls_per_op"].get(endpoint, 0)
+            if after > before:
+                problems.append(f"{old['name']}: {endpoint} calls/op {before} -> {after}")
+        if new["p50_ms"] > old["p50_ms"] * (1 + tolerance):
+            problems.append(f"{old['name']}: p50 {old['p50_ms']}ms -> {new['p50_ms']}ms")
+    return problems
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--latency", type=float, default=0.05, help="Injected API latency in seconds")
+    ap.add_argument("--iterations", type=int, default=20)
+    ap.add_argument("--out", help="Write JSON results here (default: stdout)")
+    ap.add_argument("--baseline", help="Earlier results to check for regressions")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="Allowed p50 slowdown (0.25 = 25%%)")
+    args = ap.parse_args(argv)
+
+    results = run(args.latency, args.iterations)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        Path(args.out).write_text(text + "\n")
+    else:
+        print(text)
+
+    for b in results["benchmarks"]:
+        calls = sum(b["calls_per_op"].values())
+        print(f"{b['name']:<28} p50 {b['p50_ms']:>9.2f} ms  p99 {b['p99_ms']:>9.2f} ms  "
+              f"calls/op {calls:g}  peak {b['peak_mem_kb']:.0f} KiB", file=sys.stderr)
+
+    if args.baseline:
+        problems = compare(results, json.loads(Path(args.baseline).read_text()), args.tolerance)
+        for p in problems:
+            print(f"REGRESSION {p}", file=sys.stderr)
+        return 1 if problems else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
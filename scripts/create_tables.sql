@@ -3,7 +3,22 @@ CREATE TABLE IF NOT EXISTS targets (
     target_id VARCHAR PRIMARY KEY,
     image_url VARCHAR NOT NULL,
     caption JSONB NOT NULL,
-    created_at TIMESTAMP DEFAULT NOW() NOT NULL
+    caption_status VARCHAR NOT NULL DEFAULT 'pending',
+    image_hash VARCHAR,
+    embeddings BYTEA,
+    embedding_model VARCHAR,
+    caption_hash VARCHAR,
+    created_at TIMESTAMP DEFAULT NOW() NOT NULL,
+    claimed_at TIMESTAMP
+);
+
+-- Vision captions memoized by image content hash + model/prompt version
+CREATE TABLE IF NOT EXISTS image_captions (
+    image_hash VARCHAR NOT NULL,
+    caption_version VARCHAR NOT NULL,
+    caption JSONB NOT NULL,
+    created_at TIMESTAMP DEFAULT NOW() NOT NULL,
+    PRIMARY KEY (image_hash, caption_version)
 );
 
 -- Create sessions table
@@ -15,10 +30,46 @@ CREATE TABLE IF NOT EXISTS sessions (
     stage_durations JSONB NOT NULL,
     rubric JSONB NOT NULL,
     total_score FLOAT NOT NULL,
+    status VARCHAR NOT NULL DEFAULT 'open',
     aols JSONB NOT NULL,
-    ts TIMESTAMP DEFAULT NOW() NOT NULL
+    ts TIMESTAMP DEFAULT NOW() NOT NULL,
+    notes_embedding BYTEA,
+    notes_embedding_model VARCHAR
+);
+
+-- Session notes, one row per note in the order they were taken
+CREATE TABLE IF NOT EXISTS session_notes (
+    seq SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+    stage INTEGER NOT NULL,
+    text TEXT NOT NULL,
+    client_id VARCHAR,
+    created_at TIMESTAMP DEFAULT NOW() NOT NULL
+);
+
+-- Durable scoring jobs, claimed by app.worker with SKIP LOCKED
+CREATE TABLE IF NOT EXISTS scoring_jobs (
+    job_id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES sessions(session_id) ON DELETE CASCADE,
+    idempotency_key VARCHAR NOT NULL UNIQUE,
+    status VARCHAR NOT NULL DEFAULT 'queued',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    run_at TIMESTAMP NOT NULL,
+    locked_by VARCHAR,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT NOW() NOT NULL,
+    finished_at TIMESTAMP
 );
 
 -- Create indices for better performance
 CREATE INDEX IF NOT EXISTS idx_sessions_target_id ON sessions(target_id);
-CREATE INDEX IF NOT EXISTS idx_targets_created_at ON targets(created_at); 
\ No newline at end of file
+CREATE INDEX IF NOT EXISTS idx_targets_created_at ON targets(created_at); 
+-- Unclaimed targets waiting in the pool
+CREATE INDEX IF NOT EXISTS idx_targets_pool ON targets(created_at) WHERE claimed_at IS NULL;
+CREATE INDEX IF NOT EXISTS idx_session_notes_session ON session_notes(session_id, seq);
+CREATE UNIQUE INDEX IF NOT EXISTS uq_session_notes_client ON session_notes(session_id, client_id);
+-- Open and in-progress sessions (resume lookups, scoring sweeps)
+CREATE INDEX IF NOT EXISTS idx_sessions_open ON sessions(session_id) WHERE status = 'open';
+CREATE INDEX IF NOT EXISTS idx_sessions_scoring ON sessions(session_id) WHERE status = 'scoring';
+-- Jobs due to run or whose lease may expire
+CREATE INDEX IF NOT EXISTS idx_scoring_jobs_due ON scoring_jobs(run_at) WHERE status IN ('queued', 'running');
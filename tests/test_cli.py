@@ -0,0 +1,38 @@
+import importlib
+import unittest
+from unittest import mock
+from typer.testing import CliRunner
+from app.cli import app
+
+class TestCommands(unittest.TestCase):
+    def setUp(self):
+        self.runner = CliRunner()
+
+    def test_every_command_loads(self):
+        """Each command's help renders, so its signature and imports resolve"""
+        names = [c.name or c.callback.__name__ for c in app.registered_commands]
+        self.assertIn("stats", names)
+        for name in names:
+            result = self.runner.invoke(app, [name, "--help"])
+            self.assertEqual(result.exit_code, 0, f"rv {name}: {result.output}")
+
+    def test_stats_runs(self):
+        """rv stats imports its helpers and prints the test result"""
+        res = {"sessions": 12, "skipped": 0, "mean_total_score": 1.5, "observed": 0.3,
+               "null_mean": 0.2, "null_std": 0.05, "z_score": 2.0, "p_value": 0.02}
+        with mock.patch("httpx.get") as get:
+            get.return_value.json.return_value = res
+            result = self.runner.invoke(app, ["stats", "--permutations", "10"])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn("Above chance", result.output)
+
+    def test_voice_module_imports(self):
+        """The lazily imported voice command resolves its imports"""
+        try:
+            import sounddevice  # noqa: F401
+        except (ImportError, OSError):
+            self.skipTest("sounddevice/PortAudio not available")
+        importlib.import_module("app.cli.run_mode_voice")
+
+if __name__ == "__main__":
+    unittest.main()
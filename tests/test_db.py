@@ -0,0 +1,177 @@
+import unittest
+import tempfile
+import threading
+import numpy as np
+from unittest import mock
+from datetime import datetime
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from app.db.pool import timed_pool, pool_metrics
+from app.models.base import Base
+from app.models.target import Target
+from app.models.session import Session as SessionModel
+from app.services.notes import add_note_stmt, add_notes_stmt, session_notes, notes_by_session
+from app.services.sessions import list_sessions_stmt
+from app.services.embedders import HashingEmbedder
+from app.services.judge import judge_session
+from app.services.stats import history_significance
+
+class TestPoolMetrics(unittest.TestCase):
+    def test_checkouts_are_timed(self):
+        """Every checkout is counted, and a queued one is flagged as slow"""
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = create_engine(f"sqlite:///{tmp}/pool.db", pool_size=1, max_overflow=0,
+                                   poolclass=timed_pool(QueuePool, "test"))
+            held = engine.connect()
+            threading.Timer(0.2, held.close).start()
+            with mock.patch("app.db.pool.SLOW_CHECKOUT_MS", 100), \
+                 self.assertLogs("app.db.pool", "WARNING"):
+                with engine.connect():
+                    metrics = pool_metrics(engine)
+            engine.dispose()
+        self.assertEqual((metrics["checkouts"], metrics["slow_checkouts"]), (2, 1))
+        self.assertEqual((metrics["size"], metrics["checked_out"], metrics["overflow"],
+                          metrics["max_overflow"]), (1, 1, 0, 0))
+        self.assertGreaterEqual(metrics["wait_max_ms"], 150)
+
+class TestSessions(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        now = datetime.now()
+        self.db.execute(insert(Target).values(target_id="t1", image_url="x", caption={},
+                                              created_at=now))
+        self.sids = [self.db.execute(insert(SessionModel).values(
+                        target_id="t1", user_notes="", stage_durations={}, rubric={},
+                        total_score=0, aols=[], ts=now)).inserted_primary_key[0]
+                     for _ in range(2)]
+
+    def tearDown(self):
+        self.db.close()
+
+    def _add(self, sid, stage, text):
+        self.db.execute(add_note_stmt(sid, stage, text).values(created_at=datetime.now()))
+
+    def test_transcript_keeps_insert_order(self):
+        """Notes read back in the legacy "[Stage N] text" format, interleaving ignored"""
+        a, b = self.sids
+        self._add(a, 1, "tall")
+        self._add(b, 1, "water")
+        self._add(a, 2, "grey stone")
+        self.assertEqual(session_notes(self.db, a), "\n[Stage 1] tall\n[Stage 2] grey stone")
+        self.assertEqual(notes_by_session(self.db),
+                         {a: "\n[Stage 1] tall\n[Stage 2] grey stone", b: "\n[Stage 1] water"})
+
+    def test_batch_keeps_order_and_skips_resent_notes(self):
+        """A resent batch adds only the notes the session doesn't have yet"""
+        sid = self.sids[0]
+        first = [{"stage": 1, "text": "tall", "client_id": "a"},
+                 {"stage": 2, "text": "grey", "client_id": "b"}]
+        self.assertEqual(len(self.db.execute(add_notes_stmt(self.db, sid, first)).all()), 2)
+        again = first + [{"stage": 5, "text": "water? y", "client_id": "c"}]
+        self.assertEqual(len(self.db.execute(add_notes_stmt(self.db, sid, again)).all()), 1)
+        self.assertEqual(session_notes(self.db, sid),
+                         "\n[Stage 1] tall\n[Stage 2] grey\n[Stage 5] water? y")
+
+    def test_judge_reembeds_vectors_from_another_model(self):
+        """Stale vectors are rebuilt; other models and uncaptioned targets aren't decoys"""
+        caption = {"objects": ["lake"], "colors": ["blue"], "shapes": ["round"],
+                   "materials": ["water"], "setting": "outdoors"}
+        self.db.execute(Target.__table__.update().values(
+            caption=caption, caption_status="ready", embedding_model="other",
+            embeddings=np.ones((5, 3), dtype=np.float32)))
+        self.db.execute(insert(Target).values(
+            target_id="t2", image_url="y", caption={}, created_at=datetime.now(),
+            embedding_model="other", embeddings=np.ones((5, 3), dtype=np.float32)))
+        backend = HashingEmbedder(dim=64)
+        # Same model, but only t4's caption is real; t3 holds placeholder vectors
+        for tid, status in (("t3", "failed"), ("t4", "ready")):
+            self.db.execute(insert(Target).values(
+                target_id=tid, image_url=tid, caption={}, caption_status=status,
+                created_at=datetime.now(), embedding_model=backend.model,
+                embeddings=np.ones((5, 64), dtype=np.float32)))
+        self._add(self.sids[0], 1, "blue water")
+        with mock.patch("app.services.ai.get_backend", return_value=backend):
+            res = judge_session(self.db, self.sids[0])
+        self.assertEqual(res["candidates"], 2)  # t1 and t4 only
+        tgt = self.db.get(Target, "t1")
+        self.db.refresh(tgt)
+        self.assertEqual((tgt.embedding_model, tgt.embeddings.shape), (backend.model, (5, 64)))
+
+    def test_significance_only_counts_scored_sessions(self):
+        """Open, scoring and failed sessions stay out of the permutation test"""
+        backend = HashingEmbedder(dim=64)
+        self.db.execute(Target.__table__.update().values(
+            embedding_model=backend.model, embeddings=np.ones((5, 64), dtype=np.float32)))
+        for sid in self.sids:
+            self._add(sid, 1, "blue water")
+        self.sids.append(self.db.execute(insert(SessionModel).values(
+            target_id="t1", user_notes="", stage_durations={}, rubric={}, total_score=0,
+            aols=[], ts=datetime.now(), status="open")).inserted_primary_key[0])
+        self.db.execute(SessionModel.__table__.update()
+                        .where(SessionModel.session_id.in_(self.sids[:2]))
+                        .values(status="scored", total_score=2))
+        with mock.patch("app.services.ai.get_backend", return_value=backend):
+            res = history_significance(self.db, permutations=10, seed=1)
+        self.assertEqual((res["sessions"], res["mean_total_score"]), (2, 2.0))
+
+    def test_significance_uses_stored_notes_vectors(self):
+        """Sessions scored with a notes vector don't need the embedding cache"""
+        backend = HashingEmbedder(dim=64)
+        self.db.execute(Target.__table__.update().values(
+            embedding_model=backend.model, embeddings=np.ones((5, 64), dtype=np.float32)))
+        self.db.execute(SessionModel.__table__.update().values(
+            status="scored", total_score=1, notes_embedding=np.ones(64, dtype=np.float32),
+            notes_embedding_model=backend.model))
+        with mock.patch("app.services.ai.get_backend", return_value=backend), \
+             mock.patch("app.services.stats.embed_cached") as cached:
+            res = history_significance(self.db, permutations=10, seed=1)
+        cached.assert_not_called()
+        self.assertEqual((res["sessions"], res["skipped"]), (2, 0))
+
+    def test_note_routes_only_accept_open_sessions(self):
+        """Notes can't change a finished session's transcript; unknown ids are a 404"""
+        import asyncio
+        from fastapi import HTTPException
+        from app.api import routes
+
+        class AsyncDB:  # just what the routes use, over the sync test session
+            def __init__(self, db): self.db = db
+            def get_bind(self): return self.db.get_bind()
+            async def execute(self, stmt): return self.db.execute(stmt)
+
+        sid, db = self.sids[0], AsyncDB(self.db)
+        batch = routes.NoteBatch(notes=[{"stage": 1, "text": "tall", "client_id": "a"}])
+        asyncio.run(routes.add_note(sid, {"stage": 1, "text": "grey"}, db))
+        asyncio.run(routes.add_notes(sid, batch, db))
+        self.db.execute(SessionModel.__table__.update().values(status="scored"))
+        for call, code in ((lambda: routes.add_note(sid, {"stage": 2, "text": "x"}, db), 409),
+                           (lambda: routes.add_notes(sid, batch, db), 409),
+                           (lambda: routes.add_note(10**6, {"stage": 2, "text": "x"}, db), 404)):
+            with self.assertRaises(HTTPException) as err:
+                asyncio.run(call())
+            self.assertEqual(err.exception.status_code, code)
+        self.assertEqual(session_notes(self.db, sid), "\n[Stage 1] grey\n[Stage 1] tall")
+
+    def test_no_notes(self):
+        self.assertEqual(session_notes(self.db, self.sids[0]), "")
+        self.assertEqual(notes_by_session(self.db, [self.sids[0]]), {})
+
+    def test_keyset_pages(self):
+        """Pages run newest first without overlap, filtered by status"""
+        now = datetime.now()
+        for status in ["scored", "open", "scored", "open"]:
+            self.sids.append(self.db.execute(insert(SessionModel).values(
+                target_id="t1", user_notes="", stage_durations={}, rubric={},
+                total_score=0, aols=[], status=status, ts=now)).inserted_primary_key[0])
+        page = lambda **kw: [s.session_id for s in self.db.execute(
+            list_sessions_stmt([SessionModel.session_id], limit=2, **kw))]
+        first = page()
+        self.assertEqual(first, self.sids[:-3:-1])
+        self.assertEqual(page(before=first[-1]), self.sids[-3:-5:-1])
+        self.assertEqual(page(status="scored"), [self.sids[4], self.sids[2]])
+
+if __name__ == "__main__":
+    unittest.main()
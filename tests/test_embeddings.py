@@ -0,0 +1,179 @@
+import unittest
+from contextlib import contextmanager
+import tempfile
+import os
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+from app.services.embed_cache import EmbeddingCache, cache_key
+from app.models.types import pack_vectors, unpack_vectors, unpack_many
+from app.services.embedders import OpenAIEmbedder, HashingEmbedder
+from app.services.score import score, cosine
+from app.services.ai import embed_many
+
+def _fake_embeddings_create(model, input, encoding_format):
+    """Stand-in for the embeddings.create API call (vector = text length + 1)"""
+    return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[len(t) + 1.0, 1.0])
+                                 for i, t in enumerate(input)])
+
+@contextmanager
+def _patch_embeddings(side_effect=None):
+    """Swap the shared OpenAI client for one whose embeddings.create is a mock"""
+    create = mock.AsyncMock(side_effect=side_effect)
+    client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    with mock.patch("app.services.openai_client.get_client", return_value=client):
+        yield create
+
+class TestEmbeddingCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.cache = EmbeddingCache(os.path.join(self.tmp.name, "emb.sqlite3"), max_entries=3)
+
+    def test_key_normalizes_text(self):
+        """Whitespace differences map to the same entry; models don't share"""
+        self.assertEqual(cache_key("m", "mountain  lake "), cache_key("m", "mountain lake"))
+        self.assertNotEqual(cache_key("m", "mountain lake"), cache_key("n", "mountain lake"))
+
+    def test_hits_and_misses(self):
+        """Stored vectors are returned and counted as hits"""
+        self.cache.put_many("m", ["a"], [[1.0, 2.0]])
+        found = self.cache.get_many("m", ["a", "b"])
+        self.assertEqual(found, {0: [1.0, 2.0]})
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+
+    def test_lru_eviction(self):
+        """The least recently used entry is dropped once the cache is full"""
+        self.cache.put_many("m", ["a", "b", "c"], [[1.0], [2.0], [3.0]])
+        self.cache.get_many("m", ["a"])  # refresh "a" so "b" is now the oldest
+        self.cache.put_many("m", ["d"], [[4.0]])
+        found = self.cache.get_many("m", ["a", "b", "c", "d"])
+        self.assertEqual(sorted(found), [0, 2, 3])
+        self.assertEqual(self.cache.stats()["entries"], 3)
+
+    def test_persists_across_instances(self):
+        """A new cache object on the same file sees earlier entries"""
+        self.cache.put_many("m", ["a"], [[1.0]])
+        other = EmbeddingCache(self.cache.path, max_entries=3)
+        self.assertEqual(other.get_many("m", ["a"]), {0: [1.0]})
+
+    def test_repeats_count_once(self):
+        """Whitespace variants share one key and one hit/miss"""
+        self.cache.put_many("m", ["a b"], [[1.0]])
+        found = self.cache.get_many("m", ["a b", "a  b", "c", "c"])
+        self.assertEqual(found, {0: [1.0], 1: [1.0]})
+        stats = self.cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+
+    def test_misses_are_embedded_normalized(self):
+        """The vector stored for a key is the embedding of its normalized text"""
+        backend = mock.Mock(model="m", cacheable=True)
+        backend.embed_batch.side_effect = lambda texts: [[float(len(t))] for t in texts]
+        with mock.patch("app.services.ai.get_cache", return_value=self.cache), \
+             mock.patch("app.services.ai.get_backend", return_value=backend):
+            vecs = embed_many(["blue  lake ", "blue lake"])
+        backend.embed_batch.assert_called_once_with(["blue lake"])
+        self.assertEqual(vecs, [[9.0], [9.0]])
+
+    def test_rescoring_skips_the_api(self):
+        """Scoring the same notes twice only calls the API once"""
+        desc = {"objects": ["lake"], "colors": ["blue"], "shapes": ["round"],
+                "materials": ["water"], "setting": "outdoors"}
+        cache = EmbeddingCache(os.path.join(self.tmp.name, "score.sqlite3"))
+        with mock.patch("app.services.ai.get_cache", return_value=cache), \
+             mock.patch("app.services.ai.get_backend", return_value=OpenAIEmbedder()), \
+             _patch_embeddings(_fake_embeddings_create) as create:
+            first = score("blue water", desc)
+            second = score("blue water", desc)
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(first, second)
+
+class TestPackedVectors(unittest.TestCase):
+    def test_round_trip(self):
+        """float32 and float16 matrices survive packing"""
+        mat = np.arange(12, dtype=np.float32).reshape(3, 4) / 7
+        np.testing.assert_array_equal(unpack_vectors(pack_vectors(mat)), mat)
+        half = unpack_vectors(pack_vectors(mat, "float16"))
+        self.assertEqual(half.dtype, np.float16)
+        np.testing.assert_allclose(half, mat, rtol=1e-3)
+
+    def test_single_vector_and_size(self):
+        """A 1-D vector loads as one row and costs 4 bytes per float32"""
+        blob = pack_vectors([1.0, 2.0, 3.0])
+        self.assertEqual(len(blob), 4 + 3 * 4)
+        self.assertEqual(unpack_vectors(blob).shape, (1, 3))
+
+    def test_load_does_not_copy(self):
+        """Loaded arrays are views over the fetched bytes"""
+        blob = pack_vectors(np.ones((5, 8)))
+        arr = unpack_vectors(blob)
+        self.assertFalse(arr.flags.owndata)
+        self.assertFalse(arr.flags.writeable)
+
+    def test_unpack_many(self):
+        """Bulk load stacks rows and skips headers; mixed dtypes still work"""
+        mats = [np.full((5, 8), i, dtype=np.float32) for i in range(4)]
+        for dtype in ("float32", "float16"):
+            bulk = unpack_many([pack_vectors(m, dtype) for m in mats])
+            self.assertEqual(bulk.shape, (4, 5, 8))
+            np.testing.assert_array_equal(bulk, np.stack(mats))
+        mixed = unpack_many([pack_vectors(mats[0]), pack_vectors(mats[1], "float16")])
+        np.testing.assert_array_equal(mixed, np.stack(mats[:2]))
+
+class TestHashingEmbedder(unittest.TestCase):
+    def setUp(self):
+        self.embedder = HashingEmbedder(dim=512)
+
+    def test_deterministic_and_normalized(self):
+        a, b = self.embedder.embed_batch(["mountain lake", "mountain lake"])
+        self.assertEqual(a, b)
+        self.assertEqual(len(a), 512)
+        self.assertAlmostEqual(float(np.linalg.norm(a)), 1.0, places=5)
+
+    def test_related_text_is_closer(self):
+        """Shared words and word stems score higher than unrelated text"""
+        base, related, other = self.embedder.embed_batch(
+            ["mountain lake", "mountains with a lake", "office building"])
+        self.assertGreater(cosine(base, related), 0.5)
+        self.assertGreater(cosine(base, related), cosine(base, other))
+
+    def test_empty_text(self):
+        self.assertEqual(self.embedder.embed_batch([""])[0], [0.0] * 512)
+
+    def test_scoring_runs_offline(self):
+        """With the local backend score() never touches the OpenAI API"""
+        desc = {"objects": ["lake"], "colors": ["blue"], "shapes": ["round"],
+                "materials": ["water"], "setting": "outdoors"}
+        with mock.patch("app.services.ai.get_backend", return_value=self.embedder), \
+             _patch_embeddings() as create:
+            good = score("blue water in a round lake outdoors", desc)
+            poor = score("office building with windows", desc)
+        create.assert_not_called()
+        self.assertGreater(good["total"], poor["total"])
+
+class TestOpenAIClient(unittest.TestCase):
+    def _error(self, status, headers=None):
+        import httpx, openai
+        response = httpx.Response(status, headers=headers,
+                                  request=httpx.Request("POST", "http://test/v1/embeddings"))
+        cls = openai.RateLimitError if status == 429 else openai.InternalServerError
+        return cls("busy", response=response, body=None)
+
+    def test_retries_rate_limits_then_succeeds(self):
+        """429 and 5xx responses are retried on the shared client"""
+        side_effect = [self._error(429), self._error(503), _fake_embeddings_create("m", ["ab"], "float")]
+        with _patch_embeddings(side_effect) as create, \
+             mock.patch("app.services.openai_client.backoff_delay", return_value=0):
+            vectors = OpenAIEmbedder().embed_batch(["ab"])
+        self.assertEqual(create.call_count, 3)
+        self.assertEqual(vectors, [[3.0, 1.0]])
+
+    def test_backoff_honors_retry_after(self):
+        """Retry-After wins over the jittered exponential delay"""
+        from app.services.openai_client import backoff_delay, BACKOFF_BASE
+        self.assertEqual(backoff_delay(0, self._error(429, {"retry-after": "2"})), 2.0)
+        self.assertLessEqual(backoff_delay(3), BACKOFF_BASE * 8)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,135 @@
+import unittest
+import tempfile
+import os
+from io import BytesIO
+from PIL import Image
+from unittest import mock
+from datetime import datetime
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.models.base import Base
+from app.models.target import Target
+from app.services.ai import prepare_image
+from app.services.captions import get_caption
+
+class TestPrepareImage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def _save(self, name, size, fmt, mode="RGB"):
+        path = os.path.join(self.tmp.name, name)
+        Image.new(mode, size, color="blue" if mode == "RGB" else (0, 0, 255, 128)).save(path, fmt)
+        return path
+
+    def test_small_jpeg_is_sent_unchanged(self):
+        """A target that already fits is passed through byte for byte"""
+        path = self._save("small.jpg", (512, 384), "JPEG")
+        img = prepare_image(path, max_edge=512)
+        with open(path, "rb") as f:
+            self.assertEqual(img.data, f.read())
+        self.assertEqual((img.mime, img.detail, img.reencoded), ("image/jpeg", "low", False))
+
+    def test_large_image_is_downscaled(self):
+        """Oversized images shrink to the max edge and become JPEG"""
+        path = self._save("big.png", (2000, 1000), "PNG", mode="RGBA")
+        img = prepare_image(path, max_edge=768)
+        self.assertTrue(img.reencoded)
+        self.assertEqual(img.mime, "image/jpeg")
+        self.assertEqual(img.size, (768, 384))
+        self.assertEqual(img.detail, "high")
+        self.assertEqual(Image.open(BytesIO(img.data)).size, (768, 384))
+        self.assertGreaterEqual(img.encode_ms, 0)
+
+    def test_unsupported_format_is_reencoded(self):
+        path = self._save("small.bmp", (64, 64), "BMP")
+        img = prepare_image(path, max_edge=512)
+        self.assertTrue(img.reencoded)
+        self.assertEqual((img.mime, img.detail), ("image/jpeg", "low"))
+
+    def test_invalid_file_raises(self):
+        path = os.path.join(self.tmp.name, "broken.jpg")
+        with open(path, "wb") as f:
+            f.write(b"not an image")
+        with self.assertRaises(Exception):
+            prepare_image(path)
+
+class TestCaptionCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.addCleanup(self.db.close)
+
+    def _target(self, tid, path):
+        self.db.add(Target(target_id=tid, image_url=path, caption={}, created_at=datetime.now()))
+        self.db.flush()
+        return self.db.get(Target, tid)
+
+    def test_same_image_is_captioned_once(self):
+        """A second target with identical bytes reuses the stored caption"""
+        caption = {"objects": ["lake"], "colors": ["blue"], "shapes": [], "materials": [], "setting": "outdoors"}
+        paths = []
+        for name in ("a.jpg", "b.jpg"):
+            paths.append(os.path.join(self.tmp.name, name))
+            Image.new("RGB", (64, 64), color="blue").save(paths[-1], "JPEG")
+        with mock.patch("app.services.captions.caption_image", return_value=caption) as api:
+            self.assertEqual(get_caption(self.db, self._target("a", paths[0])), caption)
+            self.assertEqual(get_caption(self.db, self._target("b", paths[1])), caption)
+        api.assert_called_once()
+        self.db.expire_all()
+        self.assertEqual(self.db.get(Target, "b").caption_status, "ready")
+
+    def test_failure_is_not_cached(self):
+        """A failed call falls back to "unknown" and retries next time"""
+        path = os.path.join(self.tmp.name, "c.jpg")
+        Image.new("RGB", (64, 64)).save(path, "JPEG")
+        tgt = self._target("c", path)
+        with mock.patch("app.services.captions.caption_image", side_effect=RuntimeError("down")):
+            self.assertEqual(get_caption(self.db, tgt)["setting"], "unknown")
+        self.db.expire_all()
+        self.assertEqual(self.db.get(Target, "c").caption_status, "failed")
+        with mock.patch("app.services.captions.caption_image", return_value={"setting": "x"}) as api:
+            get_caption(self.db, self.db.get(Target, "c"))
+        api.assert_called_once()
+
+
+    def test_failed_caption_stores_no_vectors(self):
+        """Vectors are never built from the placeholder caption"""
+        from app.services.pipeline import prepare_target
+        path = os.path.join(self.tmp.name, "d.jpg")
+        Image.new("RGB", (64, 64)).save(path, "JPEG")
+        tgt = self._target("d", path)
+        tgt.embedding_model, tgt.caption_hash = "old", "old"
+        self.db.flush()
+        with mock.patch("app.services.captions.caption_image", side_effect=RuntimeError("down")), \
+             mock.patch("app.services.pipeline.target_vectors") as vectors:
+            self.assertEqual(prepare_target(self.db, tgt)[1], None)
+        vectors.assert_not_called()
+        self.db.expire_all()
+        tgt = self.db.get(Target, "d")
+        self.assertEqual((tgt.caption_status, tgt.embedding_model, tgt.caption_hash),
+                         ("failed", None, None))
+
+
+class TestPrecaptionPipeline(unittest.TestCase):
+    def test_duplicate_submit_joins_inflight_job(self):
+        """Submitting a target twice runs one job, and wait() joins it"""
+        import threading
+        from app.services import pipeline
+        release, calls = threading.Event(), []
+        def slow(target_id):
+            calls.append(target_id)
+            release.wait(5)
+        self.addCleanup(pipeline.shutdown)
+        with mock.patch.object(pipeline, "WORKERS", 2), mock.patch.object(pipeline, "_run", slow):
+            first = pipeline.submit("t1")
+            self.assertIs(pipeline.submit("t1"), first)
+            release.set()
+            self.assertTrue(pipeline.wait("t1"))
+        self.assertEqual(calls, ["t1"])
+
+if __name__ == "__main__":
+    unittest.main()
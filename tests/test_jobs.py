@@ -0,0 +1,137 @@
+import time
+import asyncio
+import unittest
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from unittest import mock
+from sqlalchemy import create_engine, insert, select, update
+from sqlalchemy.orm import sessionmaker
+from app.models.base import Base
+from app.models.target import Target
+from app.models.session import Session as SessionModel
+from app.models.job import ScoringJob
+from app.services import jobs, events
+
+class TestScoringJobs(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+
+        @contextmanager
+        def get_db():
+            with Session() as db, db.begin():
+                yield db
+
+        self.get_db = get_db
+        now = datetime.now()
+        with get_db() as db:
+            db.execute(insert(Target).values(target_id="t1", image_url="x", caption={},
+                                             created_at=now))
+            self.sid = db.execute(insert(SessionModel).values(
+                target_id="t1", user_notes="", stage_durations={}, rubric={}, total_score=0,
+                aols=[], ts=now)).inserted_primary_key[0]
+        for target, value in (("get_db", get_db), ("MAX_ATTEMPTS", 2)):
+            patcher = mock.patch(f"app.services.jobs.{target}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _job(self):
+        with self.get_db() as db:
+            # Not created_at: SQLite stores the NOW() default as a string
+            return db.execute(select(ScoringJob.job_id, ScoringJob.status, ScoringJob.attempts,
+                                     ScoringJob.run_at, ScoringJob.last_error)).one()
+
+    def _make_due(self):
+        with self.get_db() as db:
+            db.execute(update(ScoringJob).values(run_at=datetime.now() - timedelta(seconds=1)))
+
+    def test_enqueue_is_idempotent(self):
+        with self.get_db() as db:
+            first = jobs.enqueue(db, self.sid)
+            again = jobs.enqueue(db, self.sid)
+        self.assertEqual(first.job_id, again.job_id)
+        self.assertEqual(again.status, "queued")
+
+    def test_runs_once(self):
+        """A claimed job is done after one scoring run, and a second worker finds nothing"""
+        with self.get_db() as db:
+            jobs.enqueue(db, self.sid)
+        with mock.patch("app.services.jobs.score_session") as score:
+            self.assertTrue(jobs.run_once("w1"))
+            self.assertFalse(jobs.run_once("w2"))
+        score.assert_called_once()
+        self.assertEqual((self._job().status, self._job().attempts), ("done", 1))
+
+    def test_retry_then_dead_letter(self):
+        """Failures back off and retry, then the job is dead and the session failed"""
+        with self.get_db() as db:
+            jobs.enqueue(db, self.sid)
+        with mock.patch("app.services.jobs.score_session", side_effect=ValueError("boom")), \
+             self.assertLogs("app.services.jobs", "WARNING"):
+            jobs.run_once("w1")
+            job = self._job()
+            self.assertEqual(job.status, "queued")
+            self.assertGreater(job.run_at, datetime.now())
+            self.assertFalse(jobs.run_once("w1"))  # still backing off
+            self._make_due()
+            jobs.run_once("w1")
+        job = self._job()
+        self.assertEqual((job.status, job.attempts, job.last_error), ("dead", 2, "ValueError: boom"))
+        with self.get_db() as db:
+            status = db.execute(select(SessionModel.status)).scalar_one()
+            self.assertEqual(status, "failed")
+            self.assertEqual(jobs.enqueue(db, self.sid).status, "queued")  # finish again
+
+    def test_caption_failure_is_retried(self):
+        """A vision/image failure fails the job instead of scoring a placeholder caption"""
+        with self.get_db() as db:
+            jobs.enqueue(db, self.sid)
+        with self.assertLogs("app.services.jobs", "WARNING"):
+            jobs.run_once("w1")
+        job = self._job()
+        self.assertEqual((job.status, job.attempts), ("queued", 1))
+        self.assertIn("FileNotFoundError", job.last_error)
+        with self.get_db() as db:
+            self.assertEqual(db.execute(select(SessionModel.status)).scalar_one(), "open")
+
+    def test_expired_lease_is_reclaimed(self):
+        """A job whose worker died is picked up again, and the old worker can't complete it"""
+        with self.get_db() as db:
+            jobs.enqueue(db, self.sid)
+            jobs.claim(db, "dead-worker")
+        self._make_due()
+        with mock.patch("app.services.jobs.score_session"):
+            self.assertTrue(jobs.run_once("w2"))
+        with self.get_db() as db, self.assertRaises(jobs.LeaseLost):
+            jobs.complete(db, (self._job().job_id, self.sid, 1), "dead-worker")
+        self.assertEqual(self._job().status, "done")
+
+    def test_fail_after_lost_lease(self):
+        """A worker that lost its lease reports "lost" and leaves the job alone"""
+        with self.get_db() as db:
+            jobs.enqueue(db, self.sid)
+            job_id, sid, _ = jobs.claim(db, "w1")
+        with self.get_db() as db:
+            self.assertEqual(jobs.fail(db, (job_id, sid, 1), "w2", "boom"), "lost")
+            self.assertEqual(jobs.fail(db, (job_id, sid, 2), "w2", "boom"), "lost")
+        job = self._job()
+        self.assertEqual((job.status, job.attempts, job.last_error), ("running", 1, None))
+
+class TestEvents(unittest.TestCase):
+    def test_notification_wakes_only_that_session(self):
+        async def scenario():
+            with events.subscribe(1) as one, events.subscribe(2) as two:
+                asyncio.get_running_loop().call_later(
+                    0.05, events._on_notify, None, 0, events.CHANNEL, "1:scored")
+                start = time.monotonic()
+                await events.wait(one, 5)
+                woke = time.monotonic() - start
+                return woke, two.is_set()
+        woke, other = asyncio.run(scenario())
+        self.assertLess(woke, 1)
+        self.assertFalse(other)
+        self.assertEqual(dict(events._waiters), {})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,12 +1,25 @@
 import unittest
+from contextlib import contextmanager
 import json
 import os
-from app.services.score import score, cosine
+import zlib
+from types import SimpleNamespace
+from unittest import mock
+import numpy as np
+from app.services.score import score, cosine, category_texts, target_vectors
 from app.services.ai import embed, describe_image
+from app.services.embedders import OpenAIEmbedder, HashingEmbedder
+from app.services.judge import rank_against_decoys
+from app.services.stats import permutation_test
 
+@unittest.skipUnless(os.getenv("OPENAI_API_KEY"), "needs OPENAI_API_KEY")
 class TestScoring(unittest.TestCase):
     def setUp(self):
         """Set up test data"""
+        # These thresholds are tuned for OpenAI embeddings, whatever RV_EMBED_BACKEND says
+        backend = mock.patch("app.services.ai.get_backend", return_value=OpenAIEmbedder())
+        backend.start()
+        self.addCleanup(backend.stop)
         # Sample image description (what GPT-4 Vision might return)
         self.sample_description = {
             "objects": ["mountain", "lake", "trees", "sky"],
@@ -286,5 +299,183 @@ class TestScoring(unittest.TestCase):
         if setting_result["rubric"]["sensory"] > 0 or setting_result["rubric"]["shape"] > 0:
             self.assertGreaterEqual(setting_result["rubric"]["sensory"], setting_result["rubric"]["shape"])
 
+class TestLocalScoring(unittest.TestCase):
+    """The same fixtures scored offline with the hashing embedder
+
+    That embedder is lexical, so paraphrases only score on shared words:
+    these check ordering rather than TestScoring's absolute thresholds.
+    """
+    def setUp(self):
+        TestScoring.setUp(self)
+        # Applied after TestScoring's OpenAI patch, so it takes precedence
+        backend = mock.patch("app.services.ai.get_backend", return_value=HashingEmbedder())
+        backend.start()
+        self.addCleanup(backend.stop)
+
+    def test_embedding_consistency(self):
+        """Identical texts match exactly; shared words beat unrelated ones"""
+        self.assertAlmostEqual(cosine(embed("mountain lake"), embed("mountain lake")), 1.0, places=5)
+        related = cosine(embed("mountain lake"), embed("mountains with a lake"))
+        unrelated = cosine(embed("mountain lake"), embed("office building"))
+        self.assertGreater(related, 0.5)
+        self.assertLess(unrelated, related)
+
+    def test_prepared_data_is_ranked(self):
+        """Excellent > good > partial > poor, and the focused notes hit their category"""
+        results = {c["name"]: score(c["notes"], self.sample_description) for c in self.test_cases}
+        totals = [results[n]["total"] for n in
+                  ("excellent_match", "good_match", "partial_match", "poor_match")]
+        self.assertEqual(totals, sorted(totals, reverse=True))
+        self.assertGreater(totals[0], totals[3])
+        self.assertLessEqual(totals[3], 0.1)
+        self.assertGreaterEqual(results["specific_color_match"]["rubric"]["color"], 1)
+        self.assertGreaterEqual(results["specific_shape_match"]["rubric"]["shape"], 1)
+
+    def test_notes_score_highest_on_their_own_image(self):
+        """Explicit notes for one mock image beat the other two images"""
+        notes = {
+            "mountain_lake": "blue and green mountains, a turquoise lake, pine trees, rock and water",
+            "beach_sunset": "orange and red sunset over the ocean, tan sand, palm trees, wavy water",
+            "city_skyline": "gray rectangular skyscrapers, streets with cars, glass, steel and concrete",
+        }
+        for name, text in notes.items():
+            totals = {img: score(text, desc)["total"] for img, desc in self.mock_images.items()}
+            self.assertEqual(max(totals, key=totals.get), name, totals)
+
+def _fake_vector(text):
+    """Deterministic pseudo-embedding for a text (shared component + noise)"""
+    rng = np.random.default_rng(zlib.crc32(text.encode()))
+    return (np.ones(64) + rng.normal(size=64)).tolist()
+
+def _fake_embeddings_create(model, input, encoding_format):
+    """Stand-in for the embeddings.create API call"""
+    data = [SimpleNamespace(index=i, embedding=_fake_vector(t)) for i, t in enumerate(input)]
+    # Return items out of order to check that results are matched by index
+    return SimpleNamespace(data=data[::-1])
+
+@contextmanager
+def _patch_embeddings(side_effect=None):
+    """Swap the shared OpenAI client for one whose embeddings.create is a mock"""
+    create = mock.AsyncMock(side_effect=side_effect)
+    client = SimpleNamespace(embeddings=SimpleNamespace(create=create))
+    with mock.patch("app.services.openai_client.get_client", return_value=client):
+        yield create
+
+class TestBatchedScoring(unittest.TestCase):
+    def setUp(self):
+        self.desc = {
+            "objects": ["mountain", "lake"],
+            "colors": ["blue", "green"],
+            "shapes": ["triangular"],
+            "materials": ["rock", "water"],
+            "setting": "outdoor landscape"
+        }
+        self.notes = "blue water, tall pointed shape"
+        # Talk to the (fake) OpenAI API directly rather than through the disk cache
+        for target, value in (("app.services.ai.get_cache", None),
+                              ("app.services.ai.get_backend", OpenAIEmbedder())):
+            patcher = mock.patch(target, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_score_makes_one_embedding_request(self):
+        """score() should embed notes and all category texts in one round trip"""
+        with _patch_embeddings(_fake_embeddings_create) as create:
+            score(self.notes, self.desc)
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual(len(create.call_args.kwargs["input"]), 6)
+
+    def test_batched_score_matches_sequential(self):
+        """Batching must not change the rubric or total"""
+        with _patch_embeddings(_fake_embeddings_create):
+            result = score(self.notes, self.desc)
+
+        texts = category_texts(self.desc)
+        notes_emb = _fake_vector(self.notes)
+        cos = cosine(notes_emb, _fake_vector(texts["full"]))
+        rubric = {k: min(int(max(0, cosine(notes_emb, _fake_vector(texts[k])) - 0.3) * 4), 3)
+                  for k in ("color", "shape", "concept", "sensory")}
+        total = 0.5 * max(0, cos - 0.25) * 4 + 0.5 * sum(rubric.values()) / len(rubric)
+
+        self.assertEqual(result["rubric"], rubric)
+        self.assertAlmostEqual(result["cosine"], cos)
+        self.assertEqual(result["total"], round(total, 3))
+
+    def test_stored_target_vectors_only_embed_notes(self):
+        """With precomputed target vectors only the notes are sent to the API"""
+        with _patch_embeddings(_fake_embeddings_create) as create:
+            record, fresh = target_vectors(self.desc)
+            self.assertTrue(fresh)
+            reused, fresh = target_vectors(self.desc, record)
+            self.assertIs(reused, record)
+            self.assertFalse(fresh)
+            create.reset_mock()
+            result = score(self.notes, self.desc, record["vectors"])
+            self.assertEqual(create.call_args.kwargs["input"], [self.notes])
+            # Stored vectors are float32, so only the cosine may differ slightly
+            direct = score(self.notes, self.desc)
+            self.assertAlmostEqual(result.pop("cosine"), direct.pop("cosine"), places=5)
+            self.assertEqual(result, direct)
+
+    def test_stale_target_vectors_are_recomputed(self):
+        """Changing the caption or the embedding model invalidates stored vectors"""
+        with _patch_embeddings(_fake_embeddings_create):
+            record, _ = target_vectors(self.desc)
+            _, fresh = target_vectors({**self.desc, "setting": "indoors"}, record)
+            self.assertTrue(fresh)
+            _, fresh = target_vectors(self.desc, {**record, "model": "old-model"})
+            self.assertTrue(fresh)
+
+class TestDecoyJudging(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(7)
+        self.notes = rng.normal(size=32)
+        self.decoys = rng.normal(size=(2000, 32))
+
+    def test_matching_target_ranks_first(self):
+        """Notes identical to the target beat every decoy"""
+        res = rank_against_decoys(self.notes, self.notes * 3, self.decoys)
+        self.assertEqual(res["rank"], 1)
+        self.assertEqual(res["candidates"], 2001)
+        self.assertEqual(res["percentile"], 100.0)
+        self.assertAlmostEqual(res["similarity"], 1.0, places=5)
+        self.assertAlmostEqual(res["p_value"], 1 / 2001)
+
+    def test_rank_matches_pairwise_cosine(self):
+        """The stacked product agrees with one cosine() per decoy"""
+        target = self.decoys[0] + self.notes * 0.1
+        res = rank_against_decoys(self.notes, target, self.decoys[1:50])
+        true_sim = cosine(self.notes, target)
+        above = sum(cosine(self.notes, d) > true_sim for d in self.decoys[1:50])
+        self.assertEqual(res["rank"], above + 1)
+        self.assertAlmostEqual(res["similarity"], true_sim, places=5)
+
+    def test_no_decoys(self):
+        """Without decoys the target trivially ranks first"""
+        res = rank_against_decoys(self.notes, self.notes, np.empty((0, 32)))
+        self.assertEqual((res["rank"], res["candidates"]), (1, 1))
+
+class TestPermutationTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(11)
+        self.targets = rng.normal(size=(200, 16))
+        self.noise = rng.normal(size=(200, 16))
+
+    def test_matching_notes_are_significant(self):
+        """Notes that resemble their own targets beat shuffled pairings"""
+        res = permutation_test(self.targets + self.noise, self.targets, 2000, seed=1)
+        self.assertLess(res["p_value"], 0.01)
+        self.assertGreater(res["observed"], res["null_mean"])
+
+    def test_unrelated_notes_are_not_significant(self):
+        """Random notes look like chance"""
+        res = permutation_test(self.noise, self.targets, 2000, seed=1)
+        self.assertGreater(res["p_value"], 0.05)
+
+    def test_seed_makes_results_reproducible(self):
+        a = permutation_test(self.noise, self.targets, 500, seed=5)
+        b = permutation_test(self.noise, self.targets, 500, seed=5)
+        self.assertEqual(a, b)
+
 if __name__ == "__main__":
     unittest.main() 
\ No newline at end of file
@@ -0,0 +1,232 @@
+import unittest
+import tempfile
+import os
+from io import BytesIO
+from pathlib import Path
+from datetime import datetime, timedelta
+from unittest import mock
+import numpy as np
+from PIL import Image
+from contextlib import contextmanager
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import sessionmaker
+from app.models.base import Base
+from app.models.target import Target
+from app.services import targets
+from app.services.target_pool import claim, available
+from app.services.image_store import ImageStore, DuplicateImageError, file_hash
+from app.services.ingest import ingest
+
+def _noise_image(path, seed=0):
+    """Save a random 64×64 image (distinct seeds give unrelated dHashes)"""
+    pixels = np.random.default_rng(seed).integers(0, 255, (64, 64, 3), dtype=np.uint8)
+    Image.fromarray(pixels).save(path)
+    return path
+
+class TestTargetPool(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.addCleanup(self.db.close)
+        now = datetime.now()
+        for i, (status, claimed) in enumerate([("pending", None), ("ready", None),
+                                               ("ready", now), ("pending", None)]):
+            self.db.execute(insert(Target).values(
+                target_id=f"t{i}", image_url="x", caption={}, caption_status=status,
+                created_at=now + timedelta(seconds=i), claimed_at=claimed))
+
+    def test_claims_each_target_once(self):
+        """Captioned targets go first, then oldest; claimed ones never come back"""
+        self.assertEqual(available(self.db), 3)
+        self.assertEqual([claim(self.db) for _ in range(4)], ["t1", "t0", "t3", None])
+        self.assertEqual(available(self.db), 0)
+
+class TestLocalSource(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.library = os.path.join(tmp.name, "library")
+        os.mkdir(self.library)
+        self.store = ImageStore(os.path.join(tmp.name, "store"))
+        for target, value in (("TARGET_DIR", self.library), ("get_store", lambda: self.store)):
+            patcher = mock.patch.object(targets, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_picks_an_image_from_the_directory(self):
+        """The offline source files images from RV_TARGET_DIR into the store, once"""
+        _noise_image(os.path.join(self.library, "lake.png"))
+        open(os.path.join(self.library, "notes.txt"), "w").close()
+        seed, img_path, sha = targets._local_image()
+        self.assertEqual(img_path, str(self.store.path_for(sha, ".png")))
+        self.assertEqual(len(seed), 8)
+        with self.assertRaises(targets.TargetUnavailableError):
+            targets._local_image()
+
+    def test_finds_the_last_unused_image(self):
+        """A mostly used library still yields its remaining images"""
+        for i in range(20):
+            _noise_image(os.path.join(self.library, f"{i}.png"), seed=i)
+        shas = {targets._local_image()[2] for _ in range(20)}
+        self.assertEqual(len(shas), 20)
+        with self.assertRaises(targets.TargetUnavailableError):
+            targets._local_image()
+
+    def test_async_create_inserts_and_queues_captioning(self):
+        """acreate_target() writes the row off-loop and starts pre-captioning"""
+        import asyncio
+        _noise_image(os.path.join(self.library, "lake.png"))
+        with mock.patch.object(targets, "_insert_target") as insert_target, \
+             mock.patch.object(targets.pipeline, "submit") as submit:
+            trn = asyncio.run(targets.acreate_target("local"))
+        sha = file_hash(os.path.join(self.library, "lake.png"))
+        insert_target.assert_called_once_with(trn, str(self.store.path_for(sha, ".png")), sha)
+        submit.assert_called_once_with(trn)
+
+class TestDownloadSource(unittest.TestCase):
+    def test_failed_downloads_raise_instead_of_a_placeholder(self):
+        """No placeholder image is pooled when every download fails"""
+        import asyncio
+        store = mock.Mock(root=Path(tempfile.gettempdir()))
+        with mock.patch.object(targets, "fetch_image", side_effect=OSError("offline")), \
+             mock.patch.object(targets, "get_store", return_value=store), \
+             mock.patch.object(targets, "_insert_target") as insert_target:
+            with self.assertRaises(targets.TargetUnavailableError):
+                asyncio.run(targets.acreate_target("picsum", client=mock.Mock()))
+        insert_target.assert_not_called()
+
+class TestImageStore(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.store = ImageStore(os.path.join(tmp.name, "store"), max_distance=6)
+
+    def test_sharded_by_content(self):
+        """Files land under root/ab/cd/<sha256> and can be looked up by hash"""
+        src = _noise_image(os.path.join(self.tmp, "a.png"))
+        stored = self.store.put(src)
+        sha = file_hash(src)
+        self.assertEqual(stored.path, os.path.join(self.store.root, sha[:2], sha[2:4], sha + ".png"))
+        self.assertEqual(self.store.get(sha), stored)
+        self.assertTrue(os.path.exists(src))
+
+    def test_near_duplicates_are_rejected(self):
+        """Exact copies and resized re-encodes are refused; other images are not"""
+        src = _noise_image(os.path.join(self.tmp, "a.png"))
+        first = self.store.put(src)
+        with self.assertRaises(DuplicateImageError) as err:
+            self.store.put(src)
+        self.assertEqual(err.exception.distance, 0)
+        smaller = os.path.join(self.tmp, "a_small.jpg")
+        Image.open(src).resize((48, 48)).save(smaller, "JPEG", quality=70)
+        with self.assertRaises(DuplicateImageError) as err:
+            self.store.put(smaller)
+        self.assertEqual(err.exception.existing, first)
+        self.store.put(_noise_image(os.path.join(self.tmp, "b.png"), seed=1))
+
+    def test_concurrent_near_duplicates_only_store_one(self):
+        """Two near-duplicates put at once can't both pass the check"""
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        src = _noise_image(os.path.join(self.tmp, "a.png"))
+        copy = os.path.join(self.tmp, "a.jpg")
+        Image.open(src).save(copy, "JPEG", quality=90)
+        check = self.store.check
+        def slow_check(*args):
+            check(*args)
+            time.sleep(0.2)  # widen the window between check and insert
+        with mock.patch.object(self.store, "check", slow_check), ThreadPoolExecutor(2) as ex:
+            futures = [ex.submit(self.store.put, p) for p in (src, copy)]
+            errors = [f.exception() for f in futures]
+        self.assertEqual(sum(isinstance(e, DuplicateImageError) for e in errors), 1)
+
+    def test_index_is_shared_between_instances(self):
+        """A second store on the same root (another process) sees new images"""
+        other = ImageStore(self.store.root)
+        self.assertIsNone(other.nearest(0))
+        stored = self.store.put(_noise_image(os.path.join(self.tmp, "a.png")))
+        self.assertEqual(other.nearest(stored.phash), (stored.sha256, 0))
+
+class TestFetchImage(unittest.TestCase):
+    def _fetch(self, body, **kw):
+        import asyncio, httpx
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, content=body))
+        async def run():
+            async with httpx.AsyncClient(transport=transport) as c:
+                return await targets.fetch_image(c, "http://picsum.test/x", self.dest, **kw)
+        return asyncio.run(run())
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dest = Path(tmp.name) / "targets" / "1234.jpg"
+
+    def test_valid_image_is_moved_into_place(self):
+        """A complete image lands at dest with no temp files left behind"""
+        buf = BytesIO()
+        Image.new("RGB", (64, 64), "green").save(buf, "JPEG")
+        self.assertEqual(self._fetch(buf.getvalue()), len(buf.getvalue()))
+        self.assertEqual(self.dest.read_bytes(), buf.getvalue())
+        self.assertEqual(os.listdir(self.dest.parent), ["1234.jpg"])
+
+    def test_rejected_downloads_leave_nothing(self):
+        """Oversized, truncated and non-image bodies are all discarded"""
+        buf = BytesIO()
+        Image.new("RGB", (64, 64), "green").save(buf, "PNG")
+        for body, kw in [(buf.getvalue(), {"max_bytes": 100}),
+                         (buf.getvalue()[:-40], {}),
+                         (b"<html>not found</html>", {})]:
+            with self.assertRaises(Exception):
+                self._fetch(body, **kw)
+            self.assertEqual(os.listdir(self.dest.parent), [])
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.tmp = tmp.name
+        self.corpus = os.path.join(tmp.name, "corpus")
+        os.mkdir(self.corpus)
+        engine = create_engine("sqlite://")
+        Base.metadata.create_all(engine)
+        Session = sessionmaker(bind=engine)
+
+        @contextmanager
+        def get_db():
+            with Session() as db, db.begin():
+                yield db
+
+        self.db = Session()
+        self.addCleanup(self.db.close)
+        store = ImageStore(os.path.join(tmp.name, "store"))
+        for target, value in (("get_db", get_db), ("get_store", lambda: store)):
+            patcher = mock.patch(f"app.services.ingest.{target}", value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def _ingest(self):
+        return ingest(self.corpus, workers=1, batch_size=2, max_edge=32,
+                      checkpoint=os.path.join(self.tmp, "ckpt.jsonl"))
+
+    def test_ingest_dedupes_and_resumes(self):
+        """Images become pool targets once; bad files and near-duplicates are skipped"""
+        for i in range(3):
+            _noise_image(os.path.join(self.corpus, f"img{i}.png"), seed=i)
+        Image.open(os.path.join(self.corpus, "img0.png")).save(os.path.join(self.corpus, "copy.jpg"))
+        with open(os.path.join(self.corpus, "broken.jpg"), "wb") as f:
+            f.write(b"not an image")
+
+        stats = self._ingest()
+        self.assertEqual((stats["added"], stats["duplicates"], stats["failed"]), (3, 1, 1))
+        rows = self.db.execute(select(Target.image_url, Target.claimed_at)).all()
+        self.assertEqual(len(rows), 3)
+        self.assertTrue(all(os.path.exists(url) and claimed is None for url, claimed in rows))
+
+        _noise_image(os.path.join(self.corpus, "img3.png"), seed=3)
+        stats = self._ingest()
+        self.assertEqual((stats["skipped"], stats["added"]), (5, 1))
+
+if __name__ == "__main__":
+    unittest.main()